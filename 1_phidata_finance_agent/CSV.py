@@ -1,24 +1,32 @@
 import csv
 import json
 from pathlib import Path
-import pandas as pd
 from typing import Optional, List, Union, Any, Dict
 
 from phi.tools import Toolkit
 from phi.utils.log import logger
 
+from csv_catalog import DEFAULT_CATALOG_PATH, DEFAULT_PARQUET_DIR, CsvCatalog, ParquetCache, copy_csv
+from csv_pager import CsvPager
+from patient_index import DEFAULT_NAME_COLUMN, DEFAULT_PATIENT_INDEX_PATH, PatientIndex
+
 
 class ExtendedCsvTools(Toolkit):
     def __init__(
         self,
         csvs: Optional[List[Union[str, Path]]] = None,
         row_limit: Optional[int] = None,
+        max_output_bytes: Optional[int] = None,
         read_csvs: bool = True,
         list_csvs: bool = True,
         query_csvs: bool = True,
         read_column_names: bool = True,
+        lookup_patients: bool = True,
         duckdb_connection: Optional[Any] = None,
         duckdb_kwargs: Optional[Dict[str, Any]] = None,
+        parquet_dir: Optional[Union[str, Path]] = None,
+        patient_index_path: Optional[Union[str, Path]] = None,
+        name_column: str = DEFAULT_NAME_COLUMN,
     ):
         super().__init__(name="csv_tools")
 
@@ -32,8 +40,16 @@ class ExtendedCsvTools(Toolkit):
                 else:
                     raise ValueError(f"Invalid csv file: {_csv}")
         self.row_limit = row_limit
+        self.max_output_bytes = max_output_bytes
+        self._pager = CsvPager()
         self.duckdb_connection: Optional[Any] = duckdb_connection
         self.duckdb_kwargs: Optional[Dict[str, Any]] = duckdb_kwargs
+        self._catalog: Optional[CsvCatalog] = None
+        self.parquet_dir = Path(parquet_dir) if parquet_dir else DEFAULT_PARQUET_DIR
+        self._parquet_cache: Optional[ParquetCache] = None
+        self.patient_index_path = Path(patient_index_path) if patient_index_path else DEFAULT_PATIENT_INDEX_PATH
+        self.name_column = name_column
+        self._patient_index: Optional[PatientIndex] = None
 
         if read_csvs:
             self.register(self.read_csv_file)
@@ -41,6 +57,8 @@ class ExtendedCsvTools(Toolkit):
             self.register(self.list_csv_files)
         if read_column_names:
             self.register(self.get_columns)
+        if lookup_patients:
+            self.register(self.find_patient)
         if query_csvs:
             try:
                 import duckdb  # noqa: F401
@@ -56,12 +74,18 @@ class ExtendedCsvTools(Toolkit):
         """
         return json.dumps([_csv.stem for _csv in self.csvs])
 
-    def read_csv_file(self, csv_name: str, row_limit: Optional[int] = None) -> str:
+    def read_csv_file(
+        self, csv_name: str, row_limit: Optional[int] = None, offset: int = 0, max_bytes: Optional[int] = None
+    ) -> str:
         """Use this function to read the contents of a csv file `name` without the extension.
+        Large files are read a page at a time: if rows remain after the page, the result is
+        {"rows": [...], "next_offset": n} and the next page is read with offset=n.
 
         Args:
             csv_name (str): The name of the csv file to read without the extension.
             row_limit (Optional[int]): The number of rows to return. None returns all rows. Defaults to None.
+            offset (int): The number of rows to skip before the first returned row. Defaults to 0.
+            max_bytes (Optional[int]): Stop before the output grows past this many bytes. Defaults to None.
 
         Returns:
             str: The contents of the csv file if successful, otherwise returns an error message.
@@ -73,16 +97,10 @@ class ExtendedCsvTools(Toolkit):
             logger.info(f"Reading file: {csv_name}")
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
 
-            # Read the csv file
-            csv_data = []
+            # Read rows until the page is full, without parsing the rest of the file
             _row_limit = row_limit or self.row_limit
-            with open(str(file_path), newline="") as csvfile:
-                reader = csv.DictReader(csvfile)
-                if _row_limit is not None:
-                    csv_data = [row for row in reader][:_row_limit]
-                else:
-                    csv_data = [row for row in reader]
-            return json.dumps(csv_data)
+            _max_bytes = max_bytes or self.max_output_bytes
+            return self._pager.read_json(file_path, offset=offset, limit=_row_limit, max_bytes=_max_bytes)
         except Exception as e:
             logger.error(f"Error reading csv: {e}")
             return f"Error reading csv: {e}"
@@ -113,10 +131,69 @@ class ExtendedCsvTools(Toolkit):
             logger.error(f"Error getting columns: {e}")
             return f"Error getting columns: {e}"
 
+    def _get_catalog(self) -> CsvCatalog:
+        """Returns the DuckDB catalog shared by every query, opening it on first use.
+
+        Without a `duckdb_connection`, tables are kept in a persistent database file
+        (`duckdb_kwargs["database"]`, default csv_catalog.duckdb next to this script), or in
+        memory while another process holds that file.
+        """
+        if self._catalog is None:
+            if self.duckdb_connection is not None:
+                self._catalog = CsvCatalog(self.duckdb_connection)
+            else:
+                kwargs = dict(self.duckdb_kwargs or {})
+                kwargs.setdefault("database", str(DEFAULT_CATALOG_PATH))
+                self._catalog = CsvCatalog.connect(**kwargs)
+        return self._catalog
+
+    def _get_parquet_cache(self) -> ParquetCache:
+        """Returns the Parquet copies used by the pandas-based functions, creating the cache on first use."""
+        if self._parquet_cache is None:
+            self._parquet_cache = ParquetCache(self.parquet_dir)
+        return self._parquet_cache
+
+    def _get_patient_index(self) -> PatientIndex:
+        """Returns the name index used by find_patient, opening it on first use."""
+        if self._patient_index is None:
+            self._patient_index = PatientIndex(self.patient_index_path)
+        return self._patient_index
+
+    def find_patient(self, csv_name: str, patient_name: str, fuzzy: bool = True, limit: int = 5) -> str:
+        """Use this function to get the rows of a patient from csv file `csv_name` without the extension,
+        e.g. to answer which medication a patient was prescribed. The name is matched ignoring case
+        and extra whitespace; if no name matches exactly, the closest names are returned instead.
+
+        Args:
+            csv_name (str): The name of the csv file to search without the extension.
+            patient_name (str): The name of the patient.
+            fuzzy (bool): Return similar names when there is no exact match. Defaults to True.
+            limit (int): The maximum number of rows to return. Defaults to 5.
+
+        Returns:
+            str: The matching rows as JSON with their name and match score, otherwise returns an error message.
+        """
+        try:
+            if csv_name not in [_csv.stem for _csv in self.csvs]:
+                return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
+
+            logger.info(f"Looking up patient {patient_name} in file: {csv_name}")
+            file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
+
+            # The index is built on the first lookup and again only after the csv file changes
+            matches = self._get_patient_index().lookup(file_path, patient_name, self.name_column, fuzzy=fuzzy, limit=limit)
+            if not matches:
+                return f"No patient found matching: {patient_name}"
+            return json.dumps(matches)
+        except Exception as e:
+            logger.error(f"Error looking up patient: {e}")
+            return f"Error looking up patient: {e}"
+
     def query_csv_file(self, csv_name: str, sql_query: str) -> str:
         """Use this function to run a SQL query on csv file `csv_name` without the extension.
         The Table name is the name of the csv file without the extension.
         The SQL Query should be a valid DuckDB SQL query.
+        The csv file is loaded into DuckDB on the first query and again only after it changes.
 
         Args:
             csv_name (str): The name of the csv file to query
@@ -126,25 +203,16 @@ class ExtendedCsvTools(Toolkit):
             str: The query results if successful, otherwise returns an error message.
         """
         try:
-            import duckdb
-
             if csv_name not in [_csv.stem for _csv in self.csvs]:
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
 
-            # Load the csv file into duckdb
-            logger.info(f"Loading csv file: {csv_name}")
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
 
-            # Create duckdb connection
-            con = self.duckdb_connection
-            if not self.duckdb_connection:
-                con = duckdb.connect(**(self.duckdb_kwargs or {}))
-            if con is None:
-                logger.error("Error connecting to DuckDB")
-                return "Error connecting to DuckDB, please check the connection."
-
-            # Create a table from the csv file
-            con.execute(f"CREATE TABLE {csv_name} AS SELECT * FROM read_csv_auto('{file_path}')")
+            # Load the csv file into duckdb, unless the catalog already holds this version of it
+            catalog = self._get_catalog()
+            if not catalog.ensure_table(csv_name, file_path):
+                logger.info(f"Using cached table for csv file: {csv_name}")
+            con = catalog.connection
 
             # -*- Format the SQL Query
             # Remove backticks
@@ -183,12 +251,13 @@ class ExtendedCsvTools(Toolkit):
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
             
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
-            df = pd.read_csv(file_path)
+            # Answered from the Parquet footer: null counts and column names, no row data
+            parquet_cache = self._get_parquet_cache()
             
             issues = []
-            if df.isnull().values.any():
+            if any(parquet_cache.null_counts(file_path).values()):
                 issues.append("Missing values detected.")
-            if len(df.columns) < 2:
+            if len(parquet_cache.columns(file_path)) < 2:
                 issues.append("Less than 2 columns found.")
             
             if not issues:
@@ -204,52 +273,62 @@ class ExtendedCsvTools(Toolkit):
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
             
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
-            df = pd.read_csv(file_path)
+            # describe() only summarizes the numeric columns when there are any, so only those are read
+            parquet_cache = self._get_parquet_cache()
+            numeric_columns = parquet_cache.numeric_columns(file_path)
+            df = parquet_cache.read(file_path, columns=numeric_columns or None)
             stats = df.describe().to_json()
             return stats
         except Exception as e:
             return f"Error calculating statistics: {e}"
         
-    def filter_columns(self, csv_name: str, columns: List[str]) -> str:
-        """Extracts specific columns from the CSV."""
+    def filter_columns(self, csv_name: str, columns: List[str], filters: Optional[Dict[str, Any]] = None) -> str:
+        """Extracts specific columns from the CSV, optionally only the rows where {column: value} matches."""
         try:
             # Check if the file exists
             if csv_name not in [_csv.stem for _csv in self.csvs]:
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
             
-            # Read the CSV
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
-            df = pd.read_csv(file_path)
+            parquet_cache = self._get_parquet_cache()
             
             # Ensure the columns exist in the dataset
-            missing_columns = [col for col in columns if col not in df.columns]
+            available_columns = parquet_cache.columns(file_path)
+            missing_columns = [col for col in [*columns, *(filters or {})] if col not in available_columns]
             if missing_columns:
                 return f"Error: Columns {missing_columns} not found in the dataset."
             
-            # Filter the DataFrame for the specified columns
-            filtered_df = df[columns]
+            # Read only the specified columns (and matching rows) from the Parquet copy
+            filtered_df = parquet_cache.read(file_path, columns=columns, filters=filters)
             
             # Convert to JSON with `records` orientation for proper formatting
             return filtered_df.to_json(orient="records")
         except Exception as e:
             return f"Error filtering columns: {e}"
 
-    def clean_csv(self, csv_name: str, output_path: str, drop_duplicates: bool = True, fillna_value: Any = None) -> str:
-        """Cleans the CSV by removing duplicates and filling missing values."""
+    def clean_csv(
+        self,
+        csv_name: str,
+        output_path: str,
+        drop_duplicates: bool = True,
+        fillna_value: Any = None,
+        compression: Optional[str] = None,
+    ) -> str:
+        """Cleans the CSV by removing duplicates and filling missing values.
+        Writes Parquet if `output_path` ends in .parquet, otherwise CSV, optionally compressed (e.g. gzip, zstd)."""
         try:
             if csv_name not in [_csv.stem for _csv in self.csvs]:
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
             
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
-            df = pd.read_csv(file_path)
-            
-            if drop_duplicates:
-                df = df.drop_duplicates()
-            if fillna_value is not None:
-                df = df.fillna(fillna_value)
-            
-            df.to_csv(output_path, index=False)
-            return f"Cleaned CSV saved to {output_path}"
+            # Streamed through DuckDB, so the file never has to fit in memory
+            stats = copy_csv(
+                file_path, output_path, drop_duplicates=drop_duplicates, fillna_value=fillna_value, compression=compression
+            )
+            return (
+                f"Cleaned CSV saved to {output_path} ({stats['rows_in']} rows in, {stats['rows_out']} rows out, "
+                f"{stats['seconds']:.2f}s, {stats['rows_per_sec']:.0f} rows/s)"
+            )
         except Exception as e:
             return f"Error cleaning CSV: {e}"   
         
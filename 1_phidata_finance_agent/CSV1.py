@@ -2,24 +2,28 @@
 import csv
 import json
 from pathlib import Path
-import pandas as pd
 from typing import Optional, List, Union, Any, Dict
 
 from phi.tools import Toolkit
 from phi.utils.log import logger
 
+from csv_catalog import DEFAULT_CATALOG_PATH, DEFAULT_PARQUET_DIR, CsvCatalog, ParquetCache, copy_csv, csv_column_types
+from csv_pager import CsvPager
+
 
 class ExtendedCsvTools(Toolkit):
     def __init__(
         self,
         csvs: Optional[List[Union[str, Path]]] = None,
         row_limit: Optional[int] = None,
+        max_output_bytes: Optional[int] = None,
         read_csvs: bool = True,
         list_csvs: bool = True,
         query_csvs: bool = True,
         read_column_names: bool = True,
         duckdb_connection: Optional[Any] = None,
         duckdb_kwargs: Optional[Dict[str, Any]] = None,
+        parquet_dir: Optional[Union[str, Path]] = None,
     ):
         super().__init__(name="csv_tools")
 
@@ -33,8 +37,13 @@ class ExtendedCsvTools(Toolkit):
                 else:
                     raise ValueError(f"Invalid csv file: {_csv}")
         self.row_limit = row_limit
+        self.max_output_bytes = max_output_bytes
+        self._pager = CsvPager()
         self.duckdb_connection: Optional[Any] = duckdb_connection
         self.duckdb_kwargs: Optional[Dict[str, Any]] = duckdb_kwargs
+        self._catalog: Optional[CsvCatalog] = None
+        self.parquet_dir = Path(parquet_dir) if parquet_dir else DEFAULT_PARQUET_DIR
+        self._parquet_cache: Optional[ParquetCache] = None
 
         if read_csvs:
             self.register(self.read_csv_file)
@@ -57,12 +66,18 @@ class ExtendedCsvTools(Toolkit):
         """
         return json.dumps([_csv.stem for _csv in self.csvs])
 
-    def read_csv_file(self, csv_name: str, row_limit: Optional[int] = None) -> str:
+    def read_csv_file(
+        self, csv_name: str, row_limit: Optional[int] = None, offset: int = 0, max_bytes: Optional[int] = None
+    ) -> str:
         """Use this function to read the contents of a csv file `name` without the extension.
+        Large files are read a page at a time: if rows remain after the page, the result is
+        {"rows": [...], "next_offset": n} and the next page is read with offset=n.
 
         Args:
             csv_name (str): The name of the csv file to read without the extension.
             row_limit (Optional[int]): The number of rows to return. None returns all rows. Defaults to None.
+            offset (int): The number of rows to skip before the first returned row. Defaults to 0.
+            max_bytes (Optional[int]): Stop before the output grows past this many bytes. Defaults to None.
 
         Returns:
             str: The contents of the csv file if successful, otherwise returns an error message.
@@ -74,16 +89,10 @@ class ExtendedCsvTools(Toolkit):
             logger.info(f"Reading file: {csv_name}")
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
 
-            # Read the csv file
-            csv_data = []
+            # Read rows until the page is full, without parsing the rest of the file
             _row_limit = row_limit or self.row_limit
-            with open(str(file_path), newline="") as csvfile:
-                reader = csv.DictReader(csvfile)
-                if _row_limit is not None:
-                    csv_data = [row for row in reader][:_row_limit]
-                else:
-                    csv_data = [row for row in reader]
-            return json.dumps(csv_data)
+            _max_bytes = max_bytes or self.max_output_bytes
+            return self._pager.read_json(file_path, offset=offset, limit=_row_limit, max_bytes=_max_bytes)
         except Exception as e:
             logger.error(f"Error reading csv: {e}")
             return f"Error reading csv: {e}"
@@ -114,10 +123,33 @@ class ExtendedCsvTools(Toolkit):
             logger.error(f"Error getting columns: {e}")
             return f"Error getting columns: {e}"
 
+    def _get_catalog(self) -> CsvCatalog:
+        """Returns the DuckDB catalog shared by every query, opening it on first use.
+
+        Without a `duckdb_connection`, tables are kept in a persistent database file
+        (`duckdb_kwargs["database"]`, default csv_catalog.duckdb next to this script), or in
+        memory while another process holds that file.
+        """
+        if self._catalog is None:
+            if self.duckdb_connection is not None:
+                self._catalog = CsvCatalog(self.duckdb_connection)
+            else:
+                kwargs = dict(self.duckdb_kwargs or {})
+                kwargs.setdefault("database", str(DEFAULT_CATALOG_PATH))
+                self._catalog = CsvCatalog.connect(**kwargs)
+        return self._catalog
+
+    def _get_parquet_cache(self) -> ParquetCache:
+        """Returns the Parquet copies used by the pandas-based functions, creating the cache on first use."""
+        if self._parquet_cache is None:
+            self._parquet_cache = ParquetCache(self.parquet_dir)
+        return self._parquet_cache
+
     def query_csv_file(self, csv_name: str, sql_query: str) -> str:
         """Use this function to run a SQL query on csv file `csv_name` without the extension.
         The Table name is the name of the csv file without the extension.
         The SQL Query should be a valid DuckDB SQL query.
+        The csv file is loaded into DuckDB on the first query and again only after it changes.
 
         Args:
             csv_name (str): The name of the csv file to query
@@ -127,25 +159,16 @@ class ExtendedCsvTools(Toolkit):
             str: The query results if successful, otherwise returns an error message.
         """
         try:
-            import duckdb
-
             if csv_name not in [_csv.stem for _csv in self.csvs]:
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
 
-            # Load the csv file into duckdb
-            logger.info(f"Loading csv file: {csv_name}")
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
 
-            # Create duckdb connection
-            con = self.duckdb_connection
-            if not self.duckdb_connection:
-                con = duckdb.connect(**(self.duckdb_kwargs or {}))
-            if con is None:
-                logger.error("Error connecting to DuckDB")
-                return "Error connecting to DuckDB, please check the connection."
-
-            # Create a table from the csv file
-            con.execute(f"CREATE TABLE {csv_name} AS SELECT * FROM read_csv_auto('{file_path}')")
+            # Load the csv file into duckdb, unless the catalog already holds this version of it
+            catalog = self._get_catalog()
+            if not catalog.ensure_table(csv_name, file_path):
+                logger.info(f"Using cached table for csv file: {csv_name}")
+            con = catalog.connection
 
             # -*- Format the SQL Query
             # Remove backticks
@@ -184,12 +207,13 @@ class ExtendedCsvTools(Toolkit):
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
             
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
-            df = pd.read_csv(file_path)
+            # Answered from the Parquet footer: null counts and column names, no row data
+            parquet_cache = self._get_parquet_cache()
             
             issues = []
-            if df.isnull().values.any():
+            if any(parquet_cache.null_counts(file_path).values()):
                 issues.append("Missing values detected.")
-            if len(df.columns) < 2:
+            if len(parquet_cache.columns(file_path)) < 2:
                 issues.append("Less than 2 columns found.")
             
             if not issues:
@@ -205,19 +229,23 @@ class ExtendedCsvTools(Toolkit):
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
             
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
-            df = pd.read_csv(file_path)
+            # describe() only summarizes the numeric columns when there are any, so only those are read
+            parquet_cache = self._get_parquet_cache()
+            numeric_columns = parquet_cache.numeric_columns(file_path)
+            df = parquet_cache.read(file_path, columns=numeric_columns or None)
             stats = df.describe().to_json()
             return stats
         except Exception as e:
             return f"Error calculating statistics: {e}"
     
-    def filter_and_save_csv(self, csv_name: str, output_path: str, columns: List[str]) -> str:
+    def filter_and_save_csv(self, csv_name: str, output_path: str, columns: List[str], compression: Optional[str] = None) -> str:
         """Filters specific columns from the CSV and saves them to a new file.
 
         Args:
         csv_name (str): The name of the CSV file to filter without the extension.
-        output_path (str): The path where the filtered CSV will be saved.
+        output_path (str): The path where the filtered data will be saved; Parquet if it ends in .parquet, otherwise CSV.
         columns (List[str]): The list of columns to retain in the filtered dataset.
+        compression (Optional[str]): Output compression, e.g. gzip or zstd. Defaults to None.
 
         Returns:
         str: Success message or error message.
@@ -227,21 +255,20 @@ class ExtendedCsvTools(Toolkit):
             if csv_name not in [_csv.stem for _csv in self.csvs]:
                 return f"File: {csv_name} not found, please use one of {self.list_csv_files()}"
         
-            # Read the CSV
             file_path = [_csv for _csv in self.csvs if _csv.stem == csv_name][0]
-            df = pd.read_csv(file_path)
         
             # Ensure the columns exist in the dataset
-            missing_columns = [col for col in columns if col not in df.columns]
+            available_columns = csv_column_types(file_path)
+            missing_columns = [col for col in columns if col not in available_columns]
             if missing_columns:
                 return f"Error: Columns {missing_columns} not found in the dataset."
         
-            # Filter the DataFrame for the specified columns
-            filtered_df = df[columns]
-        
-            # Save the filtered DataFrame to a new CSV file
-            filtered_df.to_csv(output_path, index=False)
-            return f"Filtered CSV with columns {columns} saved to {output_path}"
+            # Stream only the specified columns to the new file
+            stats = copy_csv(file_path, output_path, columns=columns, compression=compression)
+            return (
+                f"Filtered CSV with columns {columns} saved to {output_path} "
+                f"({stats['rows_out']} rows, {stats['seconds']:.2f}s, {stats['rows_per_sec']:.0f} rows/s)"
+            )
         except Exception as e:
             return f"Error filtering and saving CSV: {e}"
 
@@ -0,0 +1,328 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from phi.utils.log import logger
+
+# Persistent DuckDB file holding one table per registered CSV
+DEFAULT_CATALOG_PATH = Path(__file__).parent.joinpath("csv_catalog.duckdb")
+# Parquet copies of registered CSVs, used by the pandas-based toolkit functions
+DEFAULT_PARQUET_DIR = Path(__file__).parent.joinpath("parquet_cache")
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value: Union[str, Path]) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class CsvCatalog:
+    """Materializes CSV files into DuckDB tables once, and again only when the file changes.
+
+    The source path, modification time and size of every loaded CSV are kept in the
+    `_csv_catalog` table of the same database, so a persistent database file survives
+    restarts: the next process reuses the table instead of re-parsing the CSV.
+    """
+
+    def __init__(self, connection: Any):
+        self.connection = connection
+        self._lock = threading.Lock()
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS _csv_catalog (
+                table_name VARCHAR PRIMARY KEY,
+                source VARCHAR NOT NULL,
+                mtime_ns BIGINT NOT NULL,
+                size BIGINT NOT NULL,
+                row_count BIGINT,
+                load_seconds DOUBLE
+            )"""
+        )
+
+    @classmethod
+    def connect(cls, database: Union[str, Path] = DEFAULT_CATALOG_PATH, **kwargs: Any) -> "CsvCatalog":
+        """Opens the catalog stored in `database`.
+
+        DuckDB locks a database file for a single process. If the file cannot be opened,
+        e.g. because another agent holds it, an in-memory catalog is used instead, so
+        CSVs are then loaded once per process rather than once overall.
+        """
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("`duckdb` not installed. Please install using `pip install duckdb`.")
+        try:
+            return cls(duckdb.connect(str(database), **kwargs))
+        except duckdb.IOException as e:
+            if str(database) == ":memory:":
+                raise
+            logger.warning(f"Could not open csv catalog {database}, using an in-memory catalog instead: {e}")
+            kwargs.pop("read_only", None)
+            return cls(duckdb.connect(":memory:", **kwargs))
+
+    def _table_exists(self, table_name: str) -> bool:
+        return bool(
+            self.connection.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table_name]
+            ).fetchone()[0]
+        )
+
+    def ensure_table(self, table_name: str, csv_path: Union[str, Path]) -> bool:
+        """Make `table_name` hold the current contents of `csv_path`.
+
+        Returns True if the CSV was (re)loaded, False if the existing table was up to date.
+        """
+        stat = os.stat(csv_path)
+        source = str(Path(csv_path).resolve())
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT source, mtime_ns, size FROM _csv_catalog WHERE table_name = ?", [table_name]
+            ).fetchone()
+            if row == (source, stat.st_mtime_ns, stat.st_size) and self._table_exists(table_name):
+                return False
+
+            logger.info(f"Loading csv file into DuckDB table {table_name}: {source}")
+            start = time.perf_counter()
+            self.connection.execute(
+                f"CREATE OR REPLACE TABLE {quote_identifier(table_name)} AS SELECT * FROM read_csv_auto({quote_literal(source)})"
+            )
+            row_count = self.connection.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}").fetchone()[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO _csv_catalog VALUES (?, ?, ?, ?, ?, ?)",
+                [table_name, source, stat.st_mtime_ns, stat.st_size, row_count, time.perf_counter() - start],
+            )
+            return True
+
+    def table_info(self, table_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT source, mtime_ns, size, row_count, load_seconds FROM _csv_catalog WHERE table_name = ?", [table_name]
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["source", "mtime_ns", "size", "row_count", "load_seconds"], row))
+
+    def drop(self, table_name: str) -> None:
+        with self._lock:
+            self.connection.execute(f"DROP TABLE IF EXISTS {quote_identifier(table_name)}")
+            self.connection.execute("DELETE FROM _csv_catalog WHERE table_name = ?", [table_name])
+
+
+def _memory_connection() -> Any:
+    """A private in-memory DuckDB connection, for one-off statements that should not touch the catalog file."""
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("`duckdb` not installed. Please install using `pip install duckdb`.")
+    return duckdb.connect(":memory:")
+
+
+def csv_column_types(csv_path: Union[str, Path]) -> Dict[str, str]:
+    """Column names and DuckDB types of a CSV file, from a sample of its rows."""
+    source = quote_literal(Path(csv_path).resolve())
+    connection = _memory_connection()
+    try:
+        rows = connection.execute(f"DESCRIBE SELECT * FROM read_csv_auto({source})").fetchall()
+    finally:
+        connection.close()
+    return {row[0]: row[1] for row in rows}
+
+
+def copy_csv(
+    csv_path: Union[str, Path],
+    output_path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    drop_duplicates: bool = False,
+    fillna_value: Any = None,
+    compression: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Streams a CSV file to a CSV or Parquet file (by the extension of `output_path`) without loading it into memory.
+
+    Runs on its own in-memory DuckDB connection, so it neither needs nor locks the catalog file.
+    Duplicate rows are removed with a hash aggregate that DuckDB spills to disk when
+    needed, keeping the first occurrence of each row in file order, as pandas does.
+    Missing values are then replaced by `fillna_value`; columns it cannot be cast to
+    are written as text. `compression` is passed to COPY (e.g. gzip or zstd, and
+    snappy for Parquet); a CSV named *.gz or *.zst is compressed accordingly by default.
+
+    Returns:
+        rows_in, rows_out, seconds, rows_per_sec and mb_per_sec (of the input file).
+    """
+    source = Path(csv_path).resolve()
+    relation = f"read_csv_auto({quote_literal(source)})"
+    types = csv_column_types(source)
+    columns = columns or list(types)
+
+    connection = _memory_connection()
+    try:
+        # Step 1: Build the select list, filling missing values with a value of the column's type
+        fill = quote_literal(fillna_value) if fillna_value is not None else None
+        as_text = set()
+        if fill is not None:
+            not_castable = [
+                column for column in columns
+                if not connection.execute(f"SELECT TRY_CAST({fill} AS {types[column]}) IS NOT NULL").fetchone()[0]
+            ]
+            if not_castable:
+                # Like pandas, a column only becomes text if it has missing values to fill
+                counts = ", ".join(f"COUNT(*) - COUNT({quote_identifier(column)})" for column in not_castable)
+                nulls = connection.execute(f"SELECT {counts} FROM {relation}").fetchone()
+                as_text = {column for column, count in zip(not_castable, nulls) if count}
+        expressions = []
+        for column in columns:
+            expression = quote_identifier(column)
+            if column in as_text:
+                expression = f"COALESCE(CAST({expression} AS VARCHAR), {fill})"
+            elif fill is not None:
+                expression = f"COALESCE({expression}, TRY_CAST({fill} AS {types[column]}))"
+            expressions.append(f"{expression} AS {quote_identifier(column)}")
+        select = ", ".join(expressions)
+
+        # Step 2: Deduplicate on the raw values, ordered by the first row of each group
+        if drop_duplicates:
+            raw_columns = ", ".join(quote_identifier(column) for column in columns)
+            numbered = f"SELECT {raw_columns}, row_number() OVER () AS _csv_row FROM {relation}"
+            distinct = f"SELECT {raw_columns}, min(_csv_row) AS _csv_row FROM ({numbered}) GROUP BY ALL"
+            query = f"SELECT {select} FROM ({distinct}) ORDER BY _csv_row"
+        else:
+            query = f"SELECT {select} FROM {relation}"
+
+        # Step 3: Copy to the output file
+        options = ["FORMAT parquet"] if Path(output_path).suffix.lower() == ".parquet" else ["FORMAT csv", "HEADER"]
+        if compression:
+            options.append(f"COMPRESSION {quote_literal(compression)}")
+        logger.info(f"Copying csv file {source} to {output_path}")
+        start = time.perf_counter()
+        rows_out = connection.execute(f"COPY ({query}) TO {quote_literal(output_path)} ({', '.join(options)})").fetchone()[0]
+        rows_in = connection.execute(f"SELECT COUNT(*) FROM {relation}").fetchone()[0] if drop_duplicates else rows_out
+        seconds = time.perf_counter() - start
+    finally:
+        connection.close()
+
+    stats = {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "seconds": seconds,
+        "rows_per_sec": rows_in / seconds if seconds else 0.0,
+        "mb_per_sec": os.path.getsize(source) / 1e6 / seconds if seconds else 0.0,
+    }
+    logger.info(f"Copied {rows_in} rows in, {rows_out} rows out in {seconds:.2f}s ({stats['rows_per_sec']:.0f} rows/s)")
+    return stats
+
+
+class ParquetCache:
+    """Columnar copies of CSV files, converted once and re-converted when the CSV changes.
+
+    The CSV is parsed a single time with pandas (whole-column type inference, so the
+    dtypes do not depend on chunk boundaries) and written to Parquet. Later reads only
+    load the requested columns and skip row groups that cannot match the filters.
+    The source mtime and size are stored in the Parquet footer, so a stale copy is
+    detected without reading any data.
+    """
+
+    _SOURCE_KEYS = (b"csv_source", b"csv_mtime_ns", b"csv_size")
+
+    def __init__(self, directory: Union[str, Path] = DEFAULT_PARQUET_DIR):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("`pyarrow` not installed. Please install using `pip install pyarrow`.")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fresh: Dict[str, Tuple[int, int]] = {}  # parquet path -> source (mtime_ns, size) known to match
+
+    def _parquet_path(self, source: str) -> Path:
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+        return self.directory.joinpath(f"{Path(source).stem}-{digest}.parquet")
+
+    def _is_fresh(self, parquet_path: Path, version: Tuple[int, int]) -> bool:
+        if self._fresh.get(str(parquet_path)) == version:
+            return True
+        if not parquet_path.exists():
+            return False
+        import pyarrow.parquet as pq
+
+        metadata = pq.read_schema(parquet_path).metadata or {}
+        stored = (int(metadata.get(b"csv_mtime_ns", -1)), int(metadata.get(b"csv_size", -1)))
+        return stored == version
+
+    def path(self, csv_path: Union[str, Path]) -> Path:
+        """Returns the Parquet copy of `csv_path`, converting the CSV first if the copy is missing or stale."""
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        source = str(Path(csv_path).resolve())
+        stat = os.stat(source)
+        version = (stat.st_mtime_ns, stat.st_size)
+        parquet_path = self._parquet_path(source)
+        with self._lock:
+            if not self._is_fresh(parquet_path, version):
+                logger.info(f"Converting csv file to parquet: {source}")
+                start = time.perf_counter()
+                table = pa.Table.from_pandas(pd.read_csv(source, low_memory=False), preserve_index=False)
+                metadata = dict(table.schema.metadata or {})
+                metadata.update(zip(self._SOURCE_KEYS, (source.encode("utf-8"), str(version[0]).encode(), str(version[1]).encode())))
+                tmp_path = parquet_path.with_suffix(".parquet.tmp")
+                pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+                os.replace(tmp_path, parquet_path)
+                logger.info(f"Converted {table.num_rows} rows in {time.perf_counter() - start:.2f}s")
+            self._fresh[str(parquet_path)] = version
+        return parquet_path
+
+    def columns(self, csv_path: Union[str, Path]) -> List[str]:
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(self.path(csv_path)).names
+
+    def numeric_columns(self, csv_path: Union[str, Path]) -> List[str]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pq.read_schema(self.path(csv_path))
+        return [field.name for field in schema if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)]
+
+    def null_counts(self, csv_path: Union[str, Path]) -> Dict[str, int]:
+        """Null values per column, from the row group statistics (no column data is read)."""
+        import pyarrow.parquet as pq
+
+        parquet_path = self.path(csv_path)
+        metadata = pq.ParquetFile(parquet_path).metadata
+        counts: Dict[str, int] = {name: 0 for name in metadata.schema.names}
+        unknown = set()
+        for group in range(metadata.num_row_groups):
+            row_group = metadata.row_group(group)
+            for index in range(row_group.num_columns):
+                column = row_group.column(index)
+                statistics = column.statistics
+                if statistics is None or not statistics.has_null_count:
+                    unknown.add(column.path_in_schema)
+                else:
+                    counts[column.path_in_schema] += statistics.null_count
+        if unknown:
+            # Columns written without statistics are counted from the data
+            table = pq.read_table(parquet_path, columns=sorted(unknown))
+            counts.update({name: table.column(name).null_count for name in unknown})
+        return counts
+
+    def read(
+        self,
+        csv_path: Union[str, Path],
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """Reads a DataFrame from the Parquet copy.
+
+        Args:
+            columns: Only these columns are read.
+            filters: {column: value} equality filters, pushed down to the Parquet reader.
+        """
+        import pandas as pd
+
+        pushed = [(column, "==", value) for column, value in (filters or {}).items()] or None
+        return pd.read_parquet(self.path(csv_path), columns=columns, filters=pushed)
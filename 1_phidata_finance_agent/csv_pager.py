@@ -0,0 +1,124 @@
+import csv
+import json
+import locale
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# While skipping to an offset, remember the byte position of every CHECKPOINT_ROWS-th row
+CHECKPOINT_ROWS = 10000
+
+
+class CsvPager:
+    """Reads pages of rows from a CSV file without loading the whole file.
+
+    Rows are parsed one at a time and reading stops as soon as the page is full,
+    either by row count or by the size of the JSON output. The byte position of
+    the row after each page is remembered, so the next page seeks straight to it
+    instead of re-reading the file from the top. Positions are dropped when the
+    file's mtime or size changes.
+    """
+
+    def __init__(self, encoding: Optional[str] = None):
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self._lock = threading.Lock()
+        # resolved path -> ((mtime_ns, size), fieldnames, {row offset: byte position})
+        self._files: Dict[str, Tuple[Tuple[int, int], List[str], Dict[int, int]]] = {}
+
+    def _lines(self, f, position: List[int]) -> Iterator[str]:
+        # csv.reader pulls exactly the lines of one record, so position[0] is always the end of the last row read
+        for line in f:
+            position[0] += len(line)
+            yield line.decode(self.encoding)
+
+    def _file_entry(self, f, source: str) -> Optional[Tuple[List[str], Dict[int, int]]]:
+        stat = os.fstat(f.fileno())
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._files.get(source)
+            if entry is not None and entry[0] == version:
+                return entry[1], entry[2]
+
+        position = [0]
+        fieldnames = next(csv.reader(self._lines(f, position)), None)
+        if fieldnames is None:
+            return None
+        checkpoints = {0: position[0]}
+        with self._lock:
+            self._files[source] = (version, fieldnames, checkpoints)
+        return fieldnames, checkpoints
+
+    def page(
+        self,
+        csv_path: Union[str, Path],
+        offset: int = 0,
+        limit: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Tuple[List[str], Optional[int]]:
+        """Returns (rows, next_offset) for the rows starting at `offset`.
+
+        Each row is a JSON-encoded dict. The page ends after `limit` rows, or before
+        the row that would take the JSON list past `max_bytes` (a page always holds
+        at least one row). `next_offset` is None when the end of the file was reached.
+        """
+        if offset < 0:
+            raise ValueError(f"Invalid offset: {offset}")
+        source = str(Path(csv_path).resolve())
+        with open(source, "rb") as f:
+            entry = self._file_entry(f, source)
+            if entry is None:
+                return [], None
+            fieldnames, checkpoints = entry
+
+            # Seek to the closest known row at or before the offset
+            with self._lock:
+                row_index = max(index for index in checkpoints if index <= offset)
+                start = checkpoints[row_index]
+            f.seek(start)
+            position = [start]
+            reader = csv.DictReader(self._lines(f, position), fieldnames=fieldnames)
+            new_checkpoints = {}
+            while row_index < offset:
+                if next(reader, None) is None:
+                    return [], None
+                row_index += 1
+                if row_index % CHECKPOINT_ROWS == 0:
+                    new_checkpoints[row_index] = position[0]
+
+            rows: List[str] = []
+            size = 2  # the brackets of the JSON list
+            next_offset = None
+            while True:
+                row_start = position[0]
+                row = next(reader, None)
+                if row is None:
+                    break
+                item = json.dumps(row)
+                size += len(item) + (2 if rows else 0)
+                full = limit is not None and len(rows) >= limit
+                if full or (max_bytes is not None and rows and size > max_bytes):
+                    next_offset = offset + len(rows)
+                    new_checkpoints[next_offset] = row_start
+                    break
+                rows.append(item)
+
+        with self._lock:
+            checkpoints.update(new_checkpoints)
+        return rows, next_offset
+
+    def read_json(
+        self,
+        csv_path: Union[str, Path],
+        offset: int = 0,
+        limit: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> str:
+        """A page as JSON: the list of rows if it reaches the end of the file,
+        otherwise {"rows": [...], "next_offset": n}.
+        """
+        rows, next_offset = self.page(csv_path, offset, limit, max_bytes)
+        rows_json = "[" + ", ".join(rows) + "]"
+        if next_offset is None:
+            return rows_json
+        return '{"rows": ' + rows_json + ', "next_offset": ' + str(next_offset) + "}"
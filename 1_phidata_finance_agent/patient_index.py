@@ -0,0 +1,181 @@
+import csv
+import difflib
+import json
+import locale
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from phi.utils.log import logger
+
+# SQLite file holding the name index of every indexed CSV
+DEFAULT_PATIENT_INDEX_PATH = Path(__file__).parent.joinpath("patient_index.sqlite")
+DEFAULT_NAME_COLUMN = "Name"
+# Fuzzy matches need at least this difflib similarity to the normalized query
+DEFAULT_FUZZY_CUTOFF = 0.8
+# Upper bound on the names scored for one fuzzy lookup
+MAX_FUZZY_CANDIDATES = 5000
+INSERT_BATCH_ROWS = 10000
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Case and whitespace-insensitive form of a name: "  JASmINe  aGuIlaR " -> "jasmine aguilar"."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", name or "")).strip().casefold()
+
+
+class PatientIndex:
+    """Looks up CSV rows by patient name without scanning the file.
+
+    Each CSV is read once, streaming, into an SQLite table keyed by the normalized
+    name, with one row per name token for fuzzy candidates. The source mtime and
+    size are stored with the index, so it is rebuilt only after the CSV changes.
+    """
+
+    def __init__(self, database: Union[str, Path] = DEFAULT_PATIENT_INDEX_PATH):
+        self.database = str(database)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.database, check_same_thread=False)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sources (
+                source_id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                name_column TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                row_count INTEGER,
+                build_seconds REAL,
+                UNIQUE (source, name_column)
+            );
+            CREATE TABLE IF NOT EXISTS patients (
+                source_id INTEGER NOT NULL,
+                row_number INTEGER NOT NULL,
+                name_key TEXT NOT NULL,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS patients_name ON patients (source_id, name_key);
+            CREATE TABLE IF NOT EXISTS name_tokens (
+                source_id INTEGER NOT NULL,
+                token TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                PRIMARY KEY (source_id, token, name_key)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _build(self, source_id: int, source: str, name_column: str) -> int:
+        rows = 0
+        tokens = set()
+        batch = []
+        with open(source, newline="", encoding=locale.getpreferredencoding(False)) as csvfile:
+            reader = csv.DictReader(csvfile)
+            if name_column not in (reader.fieldnames or []):
+                raise ValueError(f"Column {name_column} not found in {source}")
+            for row in reader:
+                name_key = normalize_name(row[name_column])
+                batch.append((source_id, rows, name_key, json.dumps(row)))
+                tokens.update((source_id, token, name_key) for token in name_key.split(" ") if token)
+                rows += 1
+                if len(batch) >= INSERT_BATCH_ROWS:
+                    self.connection.executemany("INSERT INTO patients VALUES (?, ?, ?, ?)", batch)
+                    batch = []
+        self.connection.executemany("INSERT INTO patients VALUES (?, ?, ?, ?)", batch)
+        self.connection.executemany("INSERT INTO name_tokens VALUES (?, ?, ?)", tokens)
+        return rows
+
+    def ensure_index(self, csv_path: Union[str, Path], name_column: str = DEFAULT_NAME_COLUMN) -> int:
+        """Index `csv_path` unless the stored index matches its current mtime and size; returns the source id."""
+        stat = os.stat(csv_path)
+        source = str(Path(csv_path).resolve())
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT source_id, mtime_ns, size FROM sources WHERE source = ? AND name_column = ?", [source, name_column]
+            ).fetchone()
+            if row is not None and row[1:] == (stat.st_mtime_ns, stat.st_size):
+                return row[0]
+
+            logger.info(f"Indexing {name_column} column of csv file: {source}")
+            start = time.perf_counter()
+            with self.connection:
+                if row is None:
+                    source_id = self.connection.execute(
+                        "INSERT INTO sources (source, name_column, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                        [source, name_column, stat.st_mtime_ns, stat.st_size],
+                    ).lastrowid
+                else:
+                    source_id = row[0]
+                    self.connection.execute("DELETE FROM patients WHERE source_id = ?", [source_id])
+                    self.connection.execute("DELETE FROM name_tokens WHERE source_id = ?", [source_id])
+                row_count = self._build(source_id, source, name_column)
+                self.connection.execute(
+                    "UPDATE sources SET mtime_ns = ?, size = ?, row_count = ?, build_seconds = ? WHERE source_id = ?",
+                    [stat.st_mtime_ns, stat.st_size, row_count, time.perf_counter() - start, source_id],
+                )
+            logger.info(f"Indexed {row_count} rows in {time.perf_counter() - start:.2f}s")
+            return source_id
+
+    def _records(self, source_id: int, name_key: str, limit: int) -> List[Dict[str, Any]]:
+        rows = self.connection.execute(
+            "SELECT record FROM patients WHERE source_id = ? AND name_key = ? ORDER BY row_number LIMIT ?",
+            [source_id, name_key, limit],
+        ).fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def _fuzzy_candidates(self, source_id: int, name_key: str) -> List[str]:
+        # Names with a token sharing the longest possible prefix with a query token, up to an equal share of
+        # MAX_FUZZY_CANDIDATES per query token (a whole-token match is the longest prefix)
+        candidates = set()
+        tokens = set(name_key.split(" "))
+        for token in tokens:
+            found = set()
+            for length in range(len(token), min(3, len(token)) - 1, -1):
+                prefix = token[:length]
+                rows = self.connection.execute(
+                    "SELECT DISTINCT name_key FROM name_tokens WHERE source_id = ? AND token >= ? AND token < ? LIMIT ?",
+                    [source_id, prefix, prefix + "\U0010ffff", MAX_FUZZY_CANDIDATES // len(tokens)],
+                ).fetchall()
+                found.update(candidate for (candidate,) in rows)
+                if len(found) >= MAX_FUZZY_CANDIDATES // len(tokens):
+                    break
+            candidates.update(found)
+        return list(candidates)
+
+    def lookup(
+        self,
+        csv_path: Union[str, Path],
+        name: str,
+        name_column: str = DEFAULT_NAME_COLUMN,
+        fuzzy: bool = True,
+        limit: int = 5,
+        cutoff: float = DEFAULT_FUZZY_CUTOFF,
+    ) -> List[Dict[str, Any]]:
+        """Up to `limit` rows whose name matches `name`, as [{"name", "score", "record"}].
+
+        An exact match on the normalized name has score 1.0. Only when there is none,
+        and `fuzzy` is set, the `limit` most similar names scoring at least `cutoff` are returned.
+        """
+        source_id = self.ensure_index(csv_path, name_column)
+        name_key = normalize_name(name)
+        if not name_key:
+            return []
+        with self._lock:
+            records = self._records(source_id, name_key, limit)
+            if records:
+                return [{"name": record[name_column], "score": 1.0, "record": record} for record in records]
+            if not fuzzy:
+                return []
+
+            matches = difflib.get_close_matches(name_key, self._fuzzy_candidates(source_id, name_key), n=limit, cutoff=cutoff)
+            results = []
+            for match in matches:
+                score = round(difflib.SequenceMatcher(None, name_key, match).ratio(), 4)
+                results.extend({"name": record[name_column], "score": score, "record": record} for record in self._records(source_id, match, limit))
+            return results[:limit]
@@ -1,22 +1,18 @@
-import pandas as pd
+import os
+import sys
+
+# The name index lives next to the toolkit, one folder up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from patient_index import PatientIndex
 
 def get_patient_medication(file_path, patient_name):
-    # Read the CSV file
-    data = pd.read_csv(file_path)
-    
-    # Normalize the 'Name' column
-    data['Name'] = data['Name'].str.lower().str.strip()
-    
-    # Normalize the input patient name
-    patient_name = patient_name.lower().strip()
-    
-    # Filter the DataFrame for the specified patient
-    patient_data = data[data['Name'] == patient_name]
+    # Look up the normalized patient name in the index instead of reading the whole CSV
+    matches = PatientIndex().lookup(file_path, patient_name, fuzzy=False, limit=1)
     
     # Check if patient data is found
-    if not patient_data.empty:
+    if matches:
         # Extract the medication
-        medication = patient_data['Medication'].values[0]
+        medication = matches[0]['record']['Medication']
         return medication
     else:
         return "No medication information found for the specified patient."
@@ -25,4 +21,4 @@ if __name__ == "__main__":
     file_path = "cleaned_healthcare_dataset.csv"
     patient_name = "Jasmine Aguilar"
     medication = get_patient_medication(file_path, patient_name)
-    print(medication)
\ No newline at end of file
+    print(medication)
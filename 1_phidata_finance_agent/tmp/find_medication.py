@@ -1,18 +1,17 @@
-import pandas as pd
+import os
+import sys
+
+# The name index lives next to the toolkit, one folder up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from patient_index import PatientIndex
 
 def get_medication_for_patient(patient_name):
-    # Reading the dataset
-    df = pd.read_csv('cleaned_healthcare_dataset.csv')
-    
-    # Converting the Name column to lowercase for case-insensitive comparison
-    df['Name'] = df['Name'].str.lower()
-    
-    # Searching for the patient by name
-    medication = df[df['Name'] == patient_name.lower()]['Medication'].values
+    # Looking up the patient in the name index (case-insensitive, built on first use)
+    matches = PatientIndex().lookup('cleaned_healthcare_dataset.csv', patient_name, fuzzy=False, limit=1)
     
     # Check if medication is found
-    if medication:
-        return medication[0]
+    if matches:
+        return matches[0]['record']['Medication']
     else:
         return 'Patient not found.'
 
@@ -20,4 +19,4 @@ def get_medication_for_patient(patient_name):
 target_patient_name = 'JASmINe aGuIlaR'
 
 # Running the function to get medication
-medication_for_patient = get_medication_for_patient(target_patient_name)
\ No newline at end of file
+medication_for_patient = get_medication_for_patient(target_patient_name)
@@ -1,21 +1,20 @@
-import pandas as pd
+import os
+import sys
+
+# The name index lives next to the toolkit, one folder up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from patient_index import PatientIndex
 
 def find_medication(patient_name):
-    # Load the dataset
-    df = pd.read_csv('cleaned_healthcare_dataset.csv')
-    
-    # Normalize the patient name to matching case
-    patient_name_normalized = patient_name.strip().lower()
-    
-    # Find the medication for the specified patient
-    patient_info = df[df['Name'].str.lower() == patient_name_normalized]
+    # Find the medication for the specified patient; names are matched ignoring case and whitespace
+    matches = PatientIndex().lookup('cleaned_healthcare_dataset.csv', patient_name, fuzzy=False, limit=1)
     
-    if not patient_info.empty:
-        return patient_info.iloc[0]['Medication']
+    if matches:
+        return matches[0]['record']['Medication']
     else:
         return "Patient not found"
 
 if __name__ == "__main__":
     patient_name = "JASmINe aGuIlaR"
     medication = find_medication(patient_name)
-    print(medication)
\ No newline at end of file
+    print(medication)
@@ -1,18 +1,16 @@
-import pandas as pd
+import os
+import sys
+
+# The name index lives next to the toolkit, one folder up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from patient_index import PatientIndex
 
 def get_medication(patient_name):
-    # Load dataset with the correct path
-    df = pd.read_csv('C:/Users/saich/Favorites/Mohan/GenerativeAI/Python/PythonPrograms/Data_Manpulation/cleaned_healthcare_dataset.csv')
-    
-    # Standardize the patient name for comparison
-    df['Name'] = df['Name'].str.lower().str.strip()
-    patient_name = patient_name.lower().strip()
-    
-    # Find the medication
-    medication = df.loc[df['Name'] == patient_name, 'Medication']
+    # Look up the patient in the name index of the dataset with the correct path
+    matches = PatientIndex().lookup('C:/Users/saich/Favorites/Mohan/GenerativeAI/Python/PythonPrograms/Data_Manpulation/cleaned_healthcare_dataset.csv', patient_name, fuzzy=False, limit=1)
     
-    if not medication.empty:
-        return medication.iloc[0]
+    if matches:
+        return matches[0]['record']['Medication']
     else:
         return 'Patient not found'
 
@@ -20,4 +18,4 @@ def get_medication(patient_name):
 patient_name = "JASmINe aGuIlaR"
 
 # Get the medication for the patient
-medication_for_patient = get_medication(patient_name)
\ No newline at end of file
+medication_for_patient = get_medication(patient_name)
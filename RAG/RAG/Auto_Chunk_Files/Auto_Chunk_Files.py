@@ -1,8 +1,18 @@
+import argparse
+import functools
 import os
+import sys
 import fitz
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
+
+# Shared helpers live in sibling folders under RAG/RAG
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chroma_writer.chroma_writer import BulkWriter
+from embedding_cache.embedding_cache import encode_with_cache
+from embedding_models.embedding_models import DEFAULT_MODEL_NAME, model_stats
+from file_fingerprint.file_fingerprint import ingest_metadata
+from ingest_pipeline.ingest_pipeline import run_pipeline
+from text_chunker.text_chunker import iter_page_chunks, iter_structured_chunks, make_token_counter
+from vector_store.vector_store import configure, get_backend, open_collection
 
 
 # Step 1: Extract Text from PDF
@@ -15,59 +25,45 @@ def extract_text_from_pdf(pdf_path):
     return text_pages
 
 
-# Step 2: Chunk the Text
-def chunk_text(text, chunk_size=1000, overlap=200):
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start = end - overlap  # Overlap for context preservation
-    return chunks
+# Step 2: Chunk the Text. "structured" chunks across pages on sentence/heading
+# boundaries by token count; "fixed" cuts each page into 1000-character chunks
+# with 200 characters of overlap (see text_chunker)
+def chunk_pages(text_pages, chunker="structured"):
+    if chunker == "structured":
+        return list(iter_structured_chunks(text_pages, count_tokens=make_token_counter(DEFAULT_MODEL_NAME)))
+    return list(iter_page_chunks(text_pages))
 
 
 # Step 3: Generate Embeddings for Chunks
-def generate_embeddings(chunks, model_name="sentence-transformers/all-MiniLM-L6-v2"):
-    model = SentenceTransformer(model_name)
-    embeddings = model.encode(chunks)
+def generate_embeddings(chunks, model_name=DEFAULT_MODEL_NAME):
+    embeddings = encode_with_cache(chunks, model_name)
     return embeddings
 
 
 # Step 4: Check if File Data Exists in ChromaDB
 def is_file_processed_in_chromadb(pdf_name):
-    client = chromadb.HttpClient(
-        host="localhost",
-        port=8000,
-        ssl=False
-    )
-    collection = client.get_or_create_collection("pdf_chunks_collection")
+    collection = open_collection("pdf_chunks_collection")
     results = collection.get(where={"source_file": pdf_name})
     return len(results["documents"]) > 0
 
 
 # Step 5: Store Chunks and Embeddings in ChromaDB
-def store_in_chromadb(pdf_name, chunks, embeddings):
-    client = chromadb.HttpClient(
-        host="localhost",
-        port=8000,
-        ssl=False
-    )
-    collection = client.get_or_create_collection("pdf_chunks_collection")
-
-    for idx, chunk in enumerate(chunks):
-        unique_id = f"{pdf_name}_chunk_{idx}"
-        collection.add(
-            ids=[unique_id],
-            metadatas=[{"chunk_index": idx, "source_file": pdf_name}],
-            documents=[chunk],
-            embeddings=[embeddings[idx].tolist()],
-        )
+def store_in_chromadb(pdf_name, chunks, embeddings, metadatas=None):
+    collection = open_collection("pdf_chunks_collection")
+
+    with BulkWriter(collection) as writer:
+        for idx, chunk in enumerate(chunks):
+            unique_id = f"{pdf_name}_chunk_{idx}"
+            metadata = {"chunk_index": idx, "source_file": pdf_name}
+            if metadatas:
+                metadata.update(metadatas[idx])
+            writer.add(unique_id, chunk, metadata, embeddings[idx])
 
     print(f"{len(chunks)} chunks from {pdf_name} successfully added to ChromaDB!")
 
 
 # Step 6: Main Workflow
-def main():
+def main(workers=1, chunker="structured"):
     pdf_folder = "C:\\Users\\saich\\Favorites\\Mohan\\RAG\\RAG"  # Update this to your folder path
     processed_files_log = "processed_files.log"
 
@@ -78,34 +74,63 @@ def main():
     else:
         processed_files = set()
 
-    # Process each new PDF file in the folder
+    # Update the log of processed files
+    def mark_processed(pdf_file):
+        with open(processed_files_log, "a") as log_file:
+            log_file.write(f"{pdf_file}\n")
+
+    # Collect the new PDF files in the folder
+    new_pdf_files = []
     for pdf_file in os.listdir(pdf_folder):
         if pdf_file.endswith(".pdf"):
-            pdf_path = os.path.join(pdf_folder, pdf_file)
-
             # Skip if already processed
             if pdf_file in processed_files or is_file_processed_in_chromadb(pdf_file):
                 print(f"Skipping already processed file: {pdf_file}")
                 continue
+            new_pdf_files.append(pdf_file)
+
+    if workers > 1:
+        # Extract in a process pool, embed in cross-file batches, write in the background
+        collection = open_collection("pdf_chunks_collection")
+        run_pipeline(
+            [os.path.join(pdf_folder, pdf_file) for pdf_file in new_pdf_files],
+            collection,
+            functools.partial(chunk_pages, chunker=chunker),
+            workers=workers,
+            on_file_done=mark_processed,
+        )
+    else:
+        for pdf_file in new_pdf_files:
+            pdf_path = os.path.join(pdf_folder, pdf_file)
 
             # Step 1: Extract text
             text_pages = extract_text_from_pdf(pdf_path)
 
             # Step 2: Chunk text
-            all_chunks = []
-            for page_text in text_pages:
-                all_chunks.extend(chunk_text(page_text))
+            all_chunks = chunk_pages(text_pages, chunker)
+            texts = [chunk.text for chunk in all_chunks]
 
             # Step 3: Generate embeddings
-            embeddings = generate_embeddings(all_chunks)
+            embeddings = generate_embeddings(texts)
+
+            # Step 4: Store in ChromaDB, with the file hash and ingestion time on every chunk
+            file_metadata = ingest_metadata(pdf_path)
+            store_in_chromadb(pdf_file, texts, embeddings, [{**file_metadata, **chunk.metadata} for chunk in all_chunks])
 
-            # Step 4: Store in ChromaDB
-            store_in_chromadb(pdf_file, all_chunks, embeddings)
+            mark_processed(pdf_file)
 
-            # Update the log of processed files
-            with open(processed_files_log, "a") as log_file:
-                log_file.write(f"{pdf_file}\n")
+    for stats in model_stats():
+        print(f"Model {stats['model_name']} loaded once in {stats['load_seconds']:.2f}s, reused {stats['hits']} times")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chunk, embed and store new PDFs in ChromaDB.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used for text extraction; >1 enables the parallel pipeline")
+    parser.add_argument("--chunker", choices=["structured", "fixed"], default="structured",
+                        help="cross-page sentence/heading-aware chunks, or fixed 1000-character chunks per page")
+    parser.add_argument("--store", choices=["chroma", "local"], default=get_backend(),
+                        help="Chroma server, or the in-process local vector index (no server needed)")
+    args = parser.parse_args()
+    configure(backend=args.store)
+    main(workers=args.workers, chunker=args.chunker)
@@ -1,205 +1,219 @@
+import argparse
+import itertools
 import os
-import fitz  # PyMuPDF for PDF
-import docx  # For DOCX files
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
-import hashlib
+import sys
 from typing import Dict
 import time
 from datetime import datetime
-
-# Define the persist directory
-PERSIST_DIRECTORY = "C:\\Users\\saich\\Favorites\\Mohan\\RAG\\RAG\\DOCUMENT_RAG\\local_chroma_db"
+from concurrent.futures import ProcessPoolExecutor
+
+# Shared helpers live in sibling folders under RAG/RAG
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from document_loader.document_loader import extract_pages_safe, extract_text, iter_pages
+from embedding_cache.embedding_cache import encode_with_cache, get_default_cache
+from embedding_models.embedding_models import DEFAULT_MODEL_NAME
+from file_fingerprint.file_fingerprint import FileFingerprints, ingest_metadata
+from folder_watcher.folder_watcher import DELETED, FolderWatcher, is_document
+from incremental_sync.incremental_sync import remove_file_chunks, sync_file
+from text_chunker.text_chunker import iter_chunks, iter_structured_chunks, make_token_counter
+from vector_store.vector_store import configure, get_backend, open_collection
+
+# Folder containing the PDF/DOCX files to index
+FOLDER_PATH = "C:\\Users\\saich\\Favorites\\Mohan\\RAG\\RAG\\DOCUMENT_RAG"
+
+# "structured" chunks across pages on sentence/heading boundaries by token count,
+# "fixed" uses 1000-character chunks with 200 characters of overlap
+CHUNKER = "structured"
 
 # Debug flag
 DEBUG = True  # Set to False to suppress debug output
 
-# Ensure the directory exists
-os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
-
 def debug_print(message):
     """Print debug messages if DEBUG is True."""
     if DEBUG:
         print(f"[DEBUG] {message}")
 
-# Initialize ChromaDB Client
-def initialize_chromadb():
-    try:
-        debug_print("Initializing ChromaDB...")
-        client = chromadb.Client(Settings(
-            chroma_api_impl="chromadb.api.fastapi.FastAPI",
-            chroma_server_host="localhost",
-            chroma_server_http_port=8000,
-            persist_directory=PERSIST_DIRECTORY
-        ))
-        debug_print(f"ChromaDB initialized with persist directory: {PERSIST_DIRECTORY}")
-        return client
-    except Exception as e:
-        debug_print(f"Error initializing ChromaDB: {str(e)}")
-        return None
-
-# Generate content hash
-def get_content_hash(file_path: str) -> str:
-    try:
-        if file_path.endswith('.pdf'):
-            doc = fitz.open(file_path)
-            content = ' '.join(page.get_text() for page in doc)
-        elif file_path.endswith('.docx'):
-            doc = docx.Document(file_path)
-            content = ' '.join(paragraph.text for paragraph in doc.paragraphs)
-        return hashlib.md5(content.encode()).hexdigest()
-    except Exception as e:
-        debug_print(f"Error generating hash for {file_path}: {str(e)}")
-        return ""
-
 # Extract text from files
 def extract_text_from_file(file_path):
     try:
-        if file_path.endswith(".pdf"):
-            doc = fitz.open(file_path)
-            text = [page.get_text() for page in doc]
-            return " ".join(text)
-        elif file_path.endswith(".docx"):
-            doc = docx.Document(file_path)
-            text = [paragraph.text for paragraph in doc.paragraphs]
-            return "\n".join(text)
+        return extract_text(file_path)
     except Exception as e:
         debug_print(f"Error extracting text from {file_path}: {str(e)}")
         return ""
 
-# Chunk text
-def chunk_text(text, chunk_size=1000, overlap=200):
-    try:
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunks.append(text[start:end])
-            start = end - overlap  # Overlap for context preservation
-        return chunks
-    except Exception as e:
-        debug_print(f"Error during text chunking: {str(e)}")
-        return []
+# Extract changed files in a process pool so process_file finds their pages cached
+def prefetch_texts(file_paths, fingerprints, workers):
+    changed = []
+    for file_path in file_paths:
+        try:
+            if os.access(file_path, os.R_OK) and fingerprints.has_changed(file_path):
+                changed.append(file_path)
+        except OSError:
+            continue
+    if len(changed) < 2:
+        return
+
+    debug_print(f"Extracting {len(changed)} changed files with {workers} workers...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for file_path, pages, error in pool.map(extract_pages_safe, changed):
+            if error:
+                debug_print(f"Error extracting text from {file_path}: {error}")
+            else:
+                # Keep the page list, so chunks and page metadata match the streamed path
+                fingerprints.set_text(file_path, pages)
 
 # Generate embeddings
-def generate_embeddings(chunks, model_name="sentence-transformers/all-MiniLM-L6-v2"):
+def generate_embeddings(chunks, model_name=DEFAULT_MODEL_NAME):
     try:
-        model = SentenceTransformer(model_name)
-        embeddings = model.encode(chunks, show_progress_bar=True)
+        embeddings = encode_with_cache(chunks, model_name, show_progress_bar=True)
+        debug_print(f"Embedding cache: {get_default_cache().stats()}")
         return embeddings
     except Exception as e:
         debug_print(f"Error generating embeddings: {str(e)}")
         return []
 
-# Retrieve existing chunks
-def get_existing_chunks(file_name, collection):
-    try:
-        results = collection.get(where={"source_file": file_name})
-        return {result["chunk_index"]: result.get("document", None) for result in results["metadatas"]}
-    except Exception as e:
-        debug_print(f"Error retrieving existing chunks from ChromaDB: {str(e)}")
-        return {}
+# Process a single file; returns True if ChromaDB was updated
+def process_file(file_path, fingerprints, collection):
+    file_name = os.path.basename(file_path)
+
+    if not os.access(file_path, os.R_OK):
+        debug_print(f"Skipping inaccessible file: {file_name}")
+        return False
 
-# Store chunks in ChromaDB
-def store_in_chromadb(file_name, chunks, embeddings, start_chunk_idx, collection):
     try:
-        if not collection:
-            debug_print("Error: ChromaDB collection is not initialized.")
-            return
+        if not fingerprints.has_changed(file_path):
+            debug_print(f"No changes detected for {file_name}. Skipping.")
+            return False
+    except OSError as e:
+        debug_print(f"Error fingerprinting {file_name}: {str(e)}")
+        return False
 
-        if not chunks or not embeddings:
-            debug_print(f"Error: Chunks or embeddings are empty for {file_name}.")
-            return
-        if len(chunks) != len(embeddings):
-            debug_print(f"Error: Mismatch in chunks and embeddings lengths for {file_name}.")
-            debug_print(f"Chunks: {len(chunks)}, Embeddings: {len(embeddings)}")
-            return
+    debug_print(f"Processing file: {file_name}")
 
-        debug_print(f"Storing {len(chunks)} chunks in ChromaDB starting at index {start_chunk_idx}...")
-        for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_chunk_idx):
-            unique_id = f"{file_name}_chunk_{idx}"
-            debug_print(f"Storing chunk {idx}: {chunk[:50]} with embedding length {len(embedding)}")
-            collection.add(
-                ids=[unique_id],
-                metadatas=[{"chunk_index": idx, "source_file": file_name}],
-                documents=[chunk],
-                embeddings=[embedding.tolist()]
-            )
-        debug_print(f"Stored {len(chunks)} chunks for {file_name}.")
+    try:
+        # Use pages prefetched by a worker process, otherwise stream the file page by page
+        pages = fingerprints.cached_text(file_path)
+        if pages is None:
+            pages = iter_pages(file_path)
+        if CHUNKER == "structured":
+            chunks = iter_structured_chunks(pages, count_tokens=make_token_counter(DEFAULT_MODEL_NAME))
+        else:
+            chunks = iter_chunks(pages)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            # Don't wipe stored chunks because of a failed or partial read
+            debug_print(f"No text extracted from {file_name}. Skipping.")
+            fingerprints.forget(file_path)
+            return False
+        sync_file(collection, file_name, itertools.chain([first_chunk], chunks), embed=generate_embeddings, log=debug_print,
+                  file_metadata=ingest_metadata(file_path, fingerprints.content_hash(file_path)))
+    except Exception as e:
+        debug_print(f"Error syncing {file_name} with ChromaDB: {str(e)}")
+        return False
+
+    fingerprints.mark_synced(file_path)
+    return True
 
+# Remove the chunks of a deleted file; returns True if ChromaDB was updated
+def remove_file(file_path, fingerprints, collection):
+    file_name = os.path.basename(file_path)
+    try:
+        remove_file_chunks(collection, file_name)
+        debug_print(f"Removed chunks for deleted file: {file_name}")
+        fingerprints.forget(file_path)
+        return True
     except Exception as e:
-        debug_print(f"Error storing chunks in ChromaDB: {str(e)}")
+        debug_print(f"Error removing chunks for {file_name}: {str(e)}")
+        return False
 
-# Process files
-def process_files(content_hashes, collection):
-    folder_path = "C:\\Users\\saich\\Favorites\\Mohan\\RAG\\RAG\\DOCUMENT_RAG"
+# Process files; returns the number of files that changed
+def process_files(fingerprints, collection, folder_path=FOLDER_PATH, workers=1):
     current_files = {
         f for f in os.listdir(folder_path)
-        if f.endswith((".pdf", ".docx")) and not f.startswith(('~', '.'))
+        if is_document(f)
     }
 
-    for file_name in current_files:
-        file_path = os.path.join(folder_path, file_name)
-
-        if not os.access(file_path, os.R_OK):
-            debug_print(f"Skipping inaccessible file: {file_name}")
-            continue
+    if workers > 1:
+        prefetch_texts([os.path.join(folder_path, f) for f in current_files], fingerprints, workers)
 
-        current_hash = get_content_hash(file_path)
-        if current_hash and file_name in content_hashes and content_hashes[file_name] == current_hash:
-            debug_print(f"No changes detected for {file_name}. Skipping.")
-            continue
-
-        debug_print(f"Processing file: {file_name}")
-
-        file_text = extract_text_from_file(file_path)
-        chunks = chunk_text(file_text)
-        embeddings = generate_embeddings(chunks)
+    changed = 0
+    for file_name in current_files:
+        if process_file(os.path.join(folder_path, file_name), fingerprints, collection):
+            changed += 1
 
-        existing_chunks = get_existing_chunks(file_name, collection)
-        modified_chunks = [
-            (idx, chunk, embedding)
-            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings))
-            if idx not in existing_chunks or existing_chunks[idx] != chunk
-        ]
+    # Files that disappeared from the folder
+    for file_path in fingerprints.tracked_files():
+        if os.path.basename(file_path) not in current_files:
+            if remove_file(file_path, fingerprints, collection):
+                changed += 1
 
-        if modified_chunks:
-            store_in_chromadb(
-                file_name,
-                [chunk for _, chunk, _ in modified_chunks],
-                [embedding for _, _, embedding in modified_chunks],
-                0,  # Start chunk index
-                collection
-            )
+    return changed
 
-        content_hashes[file_name] = current_hash
+# Connect and get the collection used by the monitor (Chroma server or local index)
+def get_collection():
+    debug_print(f"Opening collection document_chunks ({get_backend()} vector store)...")
+    return open_collection("document_chunks")
 
-# Monitor files for changes
-def monitor_files(interval=10, max_unchanged_time=60):
+# Monitor files for changes by polling; max_unchanged_time=None polls forever
+def monitor_files(interval=10, max_unchanged_time=60, workers=1):
     debug_print("Starting file monitor...")
 
-    client = initialize_chromadb()
-    if not client:
-        raise RuntimeError("Failed to initialize ChromaDB client.")
-
-    collection = client.get_or_create_collection("document_chunks")
-    content_hashes = {}
+    collection = get_collection()
+    fingerprints = FileFingerprints()
 
     last_change_time = time.time()
 
     while True:
+        if process_files(fingerprints, collection, workers=workers):
+            last_change_time = time.time()
+
         current_time = time.time()
-        if current_time - last_change_time >= max_unchanged_time:
+        if max_unchanged_time is not None and current_time - last_change_time >= max_unchanged_time:
             debug_print(f"No changes detected for {max_unchanged_time} seconds. Exiting monitor.")
             break
 
-        process_files(content_hashes, collection)
         time.sleep(interval)
 
+# Watch the folder for file system events and index changes as they happen
+def watch_files(debounce=1.0, folder_path=FOLDER_PATH, workers=1):
+    debug_print("Starting file watcher...")
+
+    collection = get_collection()
+    fingerprints = FileFingerprints()
+
+    # Catch up on anything that changed while we were not running
+    process_files(fingerprints, collection, folder_path, workers=workers)
+
+    def handle_change(file_path, kind):
+        if kind == DELETED:
+            remove_file(file_path, fingerprints, collection)
+        else:
+            process_file(file_path, fingerprints, collection)
+
+    watcher = FolderWatcher(folder_path, handle_change, debounce=debounce, log=debug_print)
+    watcher.run_forever()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep ChromaDB in sync with a folder of PDF/DOCX files.")
+    parser.add_argument("--mode", choices=["poll", "watch"], default="poll",
+                        help="poll the folder every --interval seconds, or react to file system events")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between polls")
+    parser.add_argument("--daemon", action="store_true", help="keep polling even when nothing changes")
+    parser.add_argument("--debounce", type=float, default=1.0, help="seconds a file must be quiet before indexing")
+    parser.add_argument("--workers", type=int, default=1, help="processes used to extract text from changed files")
+    parser.add_argument("--chunker", choices=["structured", "fixed"], default=CHUNKER,
+                        help="cross-page sentence/heading-aware chunks, or fixed 1000-character chunks")
+    parser.add_argument("--store", choices=["chroma", "local"], default=get_backend(),
+                        help="Chroma server, or the in-process local vector index (no server needed)")
+    args = parser.parse_args()
+    configure(backend=args.store)
+    CHUNKER = args.chunker
+
     try:
-        monitor_files()
+        if args.mode == "watch":
+            watch_files(debounce=args.debounce, workers=args.workers)
+        else:
+            monitor_files(interval=args.interval, max_unchanged_time=None if args.daemon else 60, workers=args.workers)
     except KeyboardInterrupt:
         debug_print("Monitor stopped by user")
     except Exception as e:
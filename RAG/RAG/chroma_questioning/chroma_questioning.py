@@ -1,50 +1,296 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
-
-def ask_question(question, collection, model):
-    # Generate embedding for the question
-    question_embedding = model.encode(question).tolist()
-    
-    # Query the collection
-    results = collection.query(
-        query_embeddings=[question_embedding],
-        n_results=3  # Get top 3 most relevant chunks
-    )
-    
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# Shared helpers live in sibling folders under RAG/RAG
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from context_assembly.context_assembly import DEFAULT_CONTEXT_TOKENS, assemble_context, expand_neighbours
+from embedding_models.embedding_models import get_model
+from query_cache.query_cache import QueryCache
+from reranker.reranker import DEFAULT_FETCH_K, Reranker
+from sparse_index.sparse_index import get_bm25_index
+from text_chunker.text_chunker import iter_batches
+from vector_store.vector_store import collection_key, configure, get_backend, open_collection
+
+# Questions encoded per model.encode call and query embeddings sent per collection.query request
+ENCODE_BATCH_SIZE = 256
+QUERY_BATCH_SIZE = 64
+
+# "dense" ranks by embedding distance only; "hybrid" fuses it with the BM25 ranking
+RETRIEVAL_MODES = ("dense", "hybrid")
+HYBRID_FETCH_K = 20  # candidates taken from each ranking before fusion
+RRF_K = 60
+
+
+def build_where(source_file=None, pages=None, ingested_after=None, where=None):
+    """Combine common scopes into one Chroma `where` filter (None when nothing is set).
+
+    `pages` is a (first, last) range and matches chunks overlapping it; `ingested_after`
+    is a Unix timestamp compared with the `ingested_at` chunk metadata.
+    """
+    conditions = [where] if where else []
+    if source_file:
+        conditions.append({"source_file": source_file})
+    if pages:
+        first, last = pages
+        conditions += [{"page_end": {"$gte": first}}, {"page_start": {"$lte": last}}]
+    if ingested_after is not None:
+        conditions.append({"ingested_at": {"$gte": int(ingested_after)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def query_collection(collection, query_embeddings, n_results=3, query_batch_size=QUERY_BATCH_SIZE, where=None):
+    """Run multi-embedding queries in chunks; returns one list of hits per embedding."""
+    hits = []
+    filters = {"where": where} if where else {}
+    for batch in iter_batches(query_embeddings, query_batch_size):
+        results = collection.query(
+            query_embeddings=[e.tolist() if hasattr(e, "tolist") else list(e) for e in batch],
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+            **filters,
+        )
+        for i in range(len(batch)):
+            hits.append([
+                {"id": chunk_id, "document": document, "metadata": metadata, "distance": distance}
+                for chunk_id, document, metadata, distance in zip(
+                    results["ids"][i], results["documents"][i], results["metadatas"][i], results["distances"][i]
+                )
+            ])
+    return hits
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked id lists: each id scores sum(1 / (k + rank)). Returns [(id, score)], best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_search(questions, query_embeddings, collection, n_results=3, fetch_k=HYBRID_FETCH_K, sparse_index=None,
+                  where=None):
+    """Fuse the dense and BM25 top fetch_k of each question with reciprocal rank fusion.
+
+    Exact-term questions ("cholecystectomy") are found by BM25 even when the embedding
+    misses them. Hits only found by BM25 are fetched from the collection in one `get`
+    and have distance None. Every hit carries its fused `score`.
+    With `where`, BM25 matches outside the filter are dropped by that same `get`.
+    """
+    sparse_index = sparse_index or get_bm25_index(collection_key(collection))
+    dense = query_collection(collection, query_embeddings, max(fetch_k, n_results), where=where)
+    known = {hit["id"]: hit for dense_hits in dense for hit in dense_hits}
+
+    sparse = [[chunk_id for chunk_id, _ in sparse_index.search(question, fetch_k)] for question in questions]
+    unknown = list({chunk_id for ranking in sparse for chunk_id in ranking if chunk_id not in known})
+    if unknown:
+        filters = {"where": where} if where else {}
+        results = collection.get(ids=unknown, include=["documents", "metadatas"], **filters)
+        for chunk_id, document, metadata in zip(results["ids"], results["documents"], results["metadatas"]):
+            known[chunk_id] = {"id": chunk_id, "document": document, "metadata": metadata, "distance": None}
+    if where:
+        sparse = [[chunk_id for chunk_id in ranking if chunk_id in known] for ranking in sparse]
+
+    fused = [
+        reciprocal_rank_fusion([[hit["id"] for hit in dense_hits], sparse_ids])[:n_results]
+        for dense_hits, sparse_ids in zip(dense, sparse)
+    ]
+
+    # Chunks deleted since BM25 indexed them are dropped
+    return [
+        [{**known[chunk_id], "score": score} for chunk_id, score in ranking if chunk_id in known]
+        for ranking in fused
+    ]
+
+
+def retrieve(questions, collection, model, n_results=3, cache=None, mode="dense", reranker=None, where=None):
+    """Encode a batch of questions at once and return the top hits for each.
+
+    With a QueryCache, repeated questions reuse their embedding and, while the
+    collection is unchanged, their results. With a Reranker, the top `reranker.fetch_k`
+    candidates are retrieved and re-ordered by the cross-encoder before the top
+    n_results are returned. `where` restricts every question to matching chunks
+    (see build_where).
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    if reranker is not None:
+        hits = retrieve(questions, collection, model, max(n_results, reranker.fetch_k), cache, mode, where=where)
+        return reranker.rerank(questions, hits, n_results)
+
+    def search(indexes, embeddings):
+        if mode == "hybrid":
+            return hybrid_search([questions[i] for i in indexes], embeddings, collection, n_results, where=where)
+        return query_collection(collection, embeddings, n_results, where=where)
+
+    if cache is None:
+        embeddings = model.encode(questions, batch_size=ENCODE_BATCH_SIZE)
+        return search(range(len(questions)), embeddings)
+
+    # Only candidate lists are cached; re-ranking has its own score cache
+    embeddings = cache.encode(questions, model, batch_size=ENCODE_BATCH_SIZE)
+    keys = cache.result_keys(collection, embeddings, n_results, mode, json.dumps(where, sort_keys=True))
+    hits = [cache.results.get(key) for key in keys]
+    missing = [i for i, question_hits in enumerate(hits) if question_hits is None]
+    if missing:
+        fetched = search(missing, [embeddings[i] for i in missing])
+        for i, question_hits in zip(missing, fetched):
+            cache.results.put(keys[i], question_hits)
+            hits[i] = question_hits
+    return hits
+
+
+def build_contexts(collection, hits_lists, max_tokens=DEFAULT_CONTEXT_TOKENS, window=0):
+    """One assembled context per question; neighbours of all questions come from a single `get`."""
+    hits_lists = expand_neighbours(collection, hits_lists, window)
+    return [assemble_context(hits, max_tokens) for hits in hits_lists]
+
+
+def ask_question(question, collection, model, n_results=3, cache=None, mode="dense", reranker=None, where=None,
+                 context_tokens=None, context_window=0):
+    # Retrieve the top n_results most relevant chunks
+    hits = retrieve([question], collection, model, n_results=n_results, cache=cache, mode=mode, reranker=reranker, where=where)[0]
+
     print("\nQuestion:", question)
+    if context_tokens:
+        context = build_contexts(collection, [hits], context_tokens, context_window)[0]
+        print(f"\nContext ({context['tokens']} tokens):\n")
+        print(context["text"])
+        print("-" * 50)
+        return
+
     print("\nRelevant passages:")
-    for i, doc in enumerate(results['documents'][0]):
+    for i, hit in enumerate(hits):
         print(f"\nPassage {i+1}:")
-        print(doc)
+        print(hit["document"])
         print("-" * 50)
 
+
+def read_questions(path):
+    """Yield question records from a JSONL file; each line is {"question": ...} or a bare JSON string."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"question": record}
+            record.setdefault("id", line_no)
+            yield record
+
+
+def answer_questions_file(input_path, output_path, collection, model, n_results=3, batch_size=ENCODE_BATCH_SIZE, cache=None,
+                          mode="dense", reranker=None, where=None, context_tokens=None, context_window=0):
+    """Run every question of a JSONL file and write one JSONL result line per question.
+
+    Questions are processed `batch_size` at a time: one encode call and a few
+    multi-embedding queries per batch. Each result carries the batch latency divided
+    by the batch size as `latency_ms`, and the assembled `context` when context_tokens is set.
+    """
+    count = 0
+    start = time.perf_counter()
+    with open(output_path, "w", encoding="utf-8") as out:
+        for batch in iter_batches(read_questions(input_path), batch_size):
+            batch_start = time.perf_counter()
+            hits = retrieve([record["question"] for record in batch], collection, model, n_results, cache, mode, reranker, where)
+            contexts = build_contexts(collection, hits, context_tokens, context_window) if context_tokens else [None] * len(batch)
+            latency_ms = (time.perf_counter() - batch_start) * 1000 / len(batch)
+            for record, question_hits, context in zip(batch, hits, contexts):
+                result = {**record, "hits": question_hits, "latency_ms": round(latency_ms, 3)}
+                if context is not None:
+                    result["context"] = context["text"]
+                    result["context_tokens"] = context["tokens"]
+                out.write(json.dumps(result) + "\n")
+            count += len(batch)
+
+    elapsed = time.perf_counter() - start
+    print(f"Answered {count} questions in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f} questions/sec)")
+    return count
+
+
+def parse_pages(text):
+    """"5" or "3-7" -> (first, last)."""
+    first, _, last = text.partition("-")
+    return int(first), int(last or first)
+
+
 def main():
-    # Initialize ChromaDB client
-    client = chromadb.HttpClient(
-        host="localhost",
-        port=8000,
-        ssl=False
+    parser = argparse.ArgumentParser(description="Ask questions against the ChromaDB collection.")
+    parser.add_argument("--questions-file", help="JSONL file of questions to run in batch instead of the interactive prompt")
+    parser.add_argument("--output", default="results.jsonl", help="where batch results are written as JSONL")
+    parser.add_argument("--n-results", type=int, default=3, help="passages returned per question")
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE, help="questions encoded per batch")
+    parser.add_argument("--no-cache", action="store_true", help="disable the question embedding and result caches")
+    parser.add_argument("--mode", choices=RETRIEVAL_MODES, default="dense",
+                        help="dense vector search, or dense fused with BM25 keyword search")
+    parser.add_argument("--rerank", action="store_true", help="re-rank candidates with a cross-encoder")
+    parser.add_argument("--rerank-fetch-k", type=int, default=DEFAULT_FETCH_K, help="candidates re-ranked per question")
+    parser.add_argument("--rerank-budget-ms", type=float,
+                        help="latency budget for re-ranking; over budget, the dense/hybrid ranking is returned")
+    parser.add_argument("--store", choices=["chroma", "local"], default=get_backend(),
+                        help="Chroma server, or the in-process local vector index (no server needed)")
+    parser.add_argument("--source-file", help="only search chunks of this file")
+    parser.add_argument("--pages", type=parse_pages, help="only search chunks overlapping these pages, e.g. 3-7")
+    parser.add_argument("--ingested-after", type=datetime.fromisoformat,
+                        help="only search chunks ingested on or after this date, e.g. 2024-05-01")
+    parser.add_argument("--where", type=json.loads, help="extra Chroma where filter as JSON")
+    parser.add_argument("--context-tokens", type=int, nargs="?", const=DEFAULT_CONTEXT_TOKENS,
+                        help="print one merged, de-duplicated context block of at most this many tokens instead of the passages")
+    parser.add_argument("--context-window", type=int, default=0,
+                        help="with --context-tokens, also include this many neighbouring chunks on each side of a hit")
+    args = parser.parse_args()
+
+    configure(backend=args.store)
+    where = build_where(
+        args.source_file,
+        args.pages,
+        args.ingested_after.timestamp() if args.ingested_after else None,
+        args.where,
     )
 
     try:
-        # Get the collection
-        collection = client.get_collection("pdf_chunks_collection")
-        
+        # Get the collection from the Chroma server or the local index
+        collection = open_collection("pdf_chunks_collection", create=False)
+
         # Initialize the same model used for document embeddings
-        model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        
+        model = get_model()
+
+        cache = None if args.no_cache else QueryCache()
+        reranker = Reranker(fetch_k=args.rerank_fetch_k, budget_ms=args.rerank_budget_ms) if args.rerank else None
+
         print("Successfully connected to ChromaDB!")
+
+        if args.questions_file:
+            answer_questions_file(args.questions_file, args.output, collection, model, args.n_results, args.batch_size, cache,
+                                  args.mode, reranker, where, args.context_tokens, args.context_window)
+            if cache:
+                print(f"Cache stats: {cache.stats()}")
+            if reranker:
+                print(f"Rerank stats: {reranker.stats()}")
+            return
+
         print("Ready to answer questions! Type 'quit' to exit.")
-        
+
         while True:
             question = input("\nEnter your question: ")
             if question.lower() == 'quit':
+                if cache:
+                    print(f"Cache stats: {cache.stats()}")
+                if reranker:
+                    print(f"Rerank stats: {reranker.stats()}")
                 break
-            
-            ask_question(question, collection, model)
-            
+
+            ask_question(question, collection, model, args.n_results, cache, args.mode, reranker, where, args.context_tokens, args.context_window)
+
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Shared helpers live in sibling folders under RAG/RAG
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chroma_questioning import RETRIEVAL_MODES, read_questions, retrieve
+from embedding_models.embedding_models import get_model
+from sparse_index.sparse_index import get_bm25_index, tokenize
+from vector_store.vector_store import collection_key, configure, get_backend, open_collection
+
+# Generated questions use words found in at most this many chunks
+MAX_TERM_CHUNKS = 10
+
+
+def make_term_questions(collection, n_questions=100, seed=0):
+    """Exact-term lookups: the rarest long word of randomly sampled chunks.
+
+    A hit counts when it is any chunk containing that word.
+    """
+    sparse_index = get_bm25_index(collection_key(collection))
+    ids = collection.get(include=[])["ids"]
+    sample = random.Random(seed).sample(ids, min(n_questions, len(ids)))
+    results = collection.get(ids=sample, include=["documents"])
+
+    records = []
+    for chunk_id, document in zip(results["ids"], results["documents"]):
+        words = {token for token in tokenize(document or "") if len(token) >= 6 and token.isalpha()}
+        if not words:
+            continue
+        term = min(sorted(words), key=sparse_index.document_frequency)
+        n_chunks = sparse_index.document_frequency(term)
+        if n_chunks > MAX_TERM_CHUNKS:
+            continue
+        matching = [match_id for match_id, _ in sparse_index.search(term, n_chunks)]
+        records.append({"id": chunk_id, "question": term, "expected_ids": matching or [chunk_id]})
+    return records
+
+
+def is_relevant(hit, record):
+    if hit["id"] in record.get("expected_ids", ()):
+        return True
+    expected_text = record.get("expected_text")
+    return bool(expected_text) and expected_text.lower() in (hit["document"] or "").lower()
+
+
+def evaluate(records, collection, model, mode, n_results=3):
+    """Answer questions one at a time (as ask_question does); returns recall@n and latency percentiles."""
+    found, latencies = 0, []
+    for record in records:
+        start = time.perf_counter()
+        hits = retrieve([record["question"]], collection, model, n_results, mode=mode)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += any(is_relevant(hit, record) for hit in hits)
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    return {
+        "mode": mode,
+        "questions": len(records),
+        f"recall@{n_results}": found / len(records) if records else 0.0,
+        "p50_ms": pick(0.50) if latencies else None,
+        "p95_ms": pick(0.95) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dense-only and hybrid (dense + BM25) retrieval.")
+    parser.add_argument("--questions-file",
+                        help="JSONL with question plus expected_ids or expected_text; default: generated exact-term lookups")
+    parser.add_argument("--collection", default="pdf_chunks_collection")
+    parser.add_argument("--n-questions", type=int, default=100, help="generated questions")
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--store", choices=["chroma", "local"], default=get_backend(),
+                        help="Chroma server, or the in-process local vector index (no server needed)")
+    args = parser.parse_args()
+
+    configure(backend=args.store)
+    collection = open_collection(args.collection, create=False)
+    model = get_model()
+    if args.questions_file:
+        records = list(read_questions(args.questions_file))
+    else:
+        records = make_term_questions(collection, args.n_questions)
+
+    # Warm up the model and the connection so the first question isn't counted as slow
+    retrieve(["warm up"], collection, model, args.n_results)
+
+    for mode in RETRIEVAL_MODES:
+        result = evaluate(records, collection, model, mode, args.n_results)
+        print(
+            f"{mode:>6}: recall@{args.n_results} {result[f'recall@{args.n_results}']:.3f} "
+            f"over {result['questions']} questions, p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
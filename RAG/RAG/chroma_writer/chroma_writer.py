@@ -0,0 +1,185 @@
+import os
+import time
+
+from sparse_index.sparse_index import get_bm25_index
+from vector_store.vector_store import collection_key
+
+# Used when the client cannot report the server's limit
+DEFAULT_BATCH_SIZE = 1000
+
+# One stamp file per collection (see vector_store.collection_key), rewritten on every write so query caches can tell the data changed
+VERSIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "collection_versions")
+_config = {"versions_directory": VERSIONS_DIRECTORY}
+
+
+def configure(versions_directory=None):
+    """Select the folder holding the version stamps for the rest of the process."""
+    if versions_directory is not None:
+        _config["versions_directory"] = versions_directory
+
+
+def _version_path(key):
+    return os.path.join(_config["versions_directory"], f"{key}.version")
+
+
+def bump_collection_version(collection):
+    """Record that a collection was written to (upsert or delete)."""
+    os.makedirs(_config["versions_directory"], exist_ok=True)
+    path = _version_path(collection_key(collection))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, path)
+
+
+def get_collection_version(collection):
+    """Current version stamp of a collection ("0" if it was never written through these scripts)."""
+    try:
+        with open(_version_path(collection_key(collection))) as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def get_max_batch_size(client, default=DEFAULT_BATCH_SIZE):
+    """Return the largest batch the Chroma server accepts in one request."""
+    if client is None:
+        return default
+    try:
+        if hasattr(client, "get_max_batch_size"):
+            return int(client.get_max_batch_size())
+        if hasattr(client, "max_batch_size"):
+            return int(client.max_batch_size)
+    except Exception:
+        pass
+    return default
+
+
+def _to_list(embedding):
+    return embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+
+
+class BulkWriter:
+    """Buffers chunks and upserts them into a Chroma collection in size-bounded batches.
+
+    Every written batch is also added to the collection's BM25 index (see sparse_index)
+    unless index_text=False.
+
+    Use as a context manager so the last partial batch is flushed on exit:
+
+        with BulkWriter(collection) as writer:
+            for idx, chunk in enumerate(chunks):
+                writer.add(f"chunk_{idx}", chunk, {"chunk_index": idx}, embeddings[idx])
+    """
+
+    def __init__(self, collection, batch_size=None, max_retries=3, retry_delay=1.0, log=print, index_text=True):
+        self.collection = collection
+        self.sparse_index = get_bm25_index(collection_key(collection)) if index_text else None
+        server_limit = get_max_batch_size(getattr(collection, "_client", None))
+        self.batch_size = min(batch_size or server_limit, server_limit)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.log = log
+
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._embeddings = []
+        self._update_ids = []
+        self._update_metadatas = []
+
+        self.chunks_written = 0
+        self.metadata_updates = 0
+        self.batches_written = 0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Don't push a half-built batch on top of an error
+        if exc_type is None:
+            self.close()
+        return False
+
+    def add(self, chunk_id, document, metadata, embedding):
+        """Queue one chunk, sending a batch as soon as it is full."""
+        self._ids.append(chunk_id)
+        self._documents.append(document)
+        self._metadatas.append(metadata)
+        self._embeddings.append(_to_list(embedding))
+        if len(self._ids) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, ids, documents, metadatas, embeddings):
+        """Queue several chunks at once."""
+        for chunk_id, document, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+            self.add(chunk_id, document, metadata, embedding)
+
+    def update_metadata(self, chunk_id, metadata):
+        """Queue a metadata-only update of a stored chunk (no document or embedding is sent)."""
+        self._update_ids.append(chunk_id)
+        self._update_metadatas.append(metadata)
+        if len(self._update_ids) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Upsert everything queued so far, then apply the queued metadata updates."""
+        while self._ids:
+            n = min(len(self._ids), self.batch_size)
+            self._send(self._ids[:n], self._documents[:n], self._metadatas[:n], self._embeddings[:n])
+            del self._ids[:n], self._documents[:n], self._metadatas[:n], self._embeddings[:n]
+        while self._update_ids:
+            n = min(len(self._update_ids), self.batch_size)
+            ids, metadatas = self._update_ids[:n], self._update_metadatas[:n]
+            self._with_retries(f"Metadata update of {n} chunks",
+                               lambda: self.collection.update(ids=ids, metadatas=metadatas))
+            bump_collection_version(self.collection)
+            del self._update_ids[:n], self._update_metadatas[:n]
+            self.metadata_updates += n
+
+    def _with_retries(self, action, call):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                self.log(f"{action} failed ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def _send(self, ids, documents, metadatas, embeddings):
+        start = time.perf_counter()
+        self._with_retries(
+            f"Upsert of {len(ids)} chunks",
+            lambda: self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings),
+        )
+        if self.sparse_index is not None:
+            self.sparse_index.add_documents(ids, documents, metadatas)
+        bump_collection_version(self.collection)
+        self.seconds += time.perf_counter() - start
+        self.chunks_written += len(ids)
+        self.batches_written += 1
+
+    @property
+    def chunks_per_sec(self):
+        return self.chunks_written / self.seconds if self.seconds else 0.0
+
+    def close(self):
+        """Flush the remaining chunks and report throughput."""
+        self.flush()
+        if self.chunks_written:
+            self.log(
+                f"Upserted {self.chunks_written} chunks in {self.batches_written} batches "
+                f"({self.chunks_per_sec:.1f} chunks/sec)"
+            )
+        if self.metadata_updates:
+            self.log(f"Updated the metadata of {self.metadata_updates} chunks")
+        return {
+            "chunks": self.chunks_written,
+            "metadata_updates": self.metadata_updates,
+            "batches": self.batches_written,
+            "seconds": self.seconds,
+            "chunks_per_sec": self.chunks_per_sec,
+        }
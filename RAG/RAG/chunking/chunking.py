@@ -1,7 +1,17 @@
+import argparse
+import os
+import sys
 import fitz
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
+
+# Shared helpers live in sibling folders under RAG/RAG
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chroma_writer.chroma_writer import BulkWriter
+from document_loader.document_loader import iter_pages
+from embedding_cache.embedding_cache import encode_with_cache
+from embedding_models.embedding_models import DEFAULT_MODEL_NAME
+from file_fingerprint.file_fingerprint import ingest_metadata
+from text_chunker.text_chunker import iter_batches, iter_page_chunks, iter_structured_chunks, make_token_counter
+from vector_store.vector_store import configure, get_backend, open_collection
 
 # Step 1: Extract Text from PDF
 def extract_text_from_pdf(pdf_path):
@@ -12,62 +22,68 @@ def extract_text_from_pdf(pdf_path):
         text_pages.append(page.get_text())
     return text_pages
 
-# Step 2: Chunk the Text
-def chunk_text(text, chunk_size=1000, overlap=200):
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start = end - overlap  # Overlap for context preservation
-    return chunks
+# Step 2: Chunk the Text. "structured" chunks across pages on sentence/heading
+# boundaries by token count; "fixed" cuts each page into 1000-character chunks
+# with 200 characters of overlap (see text_chunker)
+def chunk_pages(text_pages, chunker="structured"):
+    if chunker == "structured":
+        return iter_structured_chunks(text_pages, count_tokens=make_token_counter(DEFAULT_MODEL_NAME))
+    return iter_page_chunks(text_pages)
+
 
 # Step 3: Generate Embeddings for Chunks
-def generate_embeddings(chunks, model_name="sentence-transformers/all-MiniLM-L6-v2"):
-    model = SentenceTransformer(model_name)
-    embeddings = model.encode(chunks)
+def generate_embeddings(chunks, model_name=DEFAULT_MODEL_NAME):
+    embeddings = encode_with_cache(chunks, model_name)
     return embeddings
 
 
+# Connect to the vector store (Chroma server or local index) and create or get the collection
+def get_collection():
+    return open_collection("pdf_chunks_collection")
+
+
 # Step 4: Store Chunks and Embeddings in ChromaDB
 def store_in_chromadb(chunks, embeddings):
-    client = chromadb.HttpClient(
-        host="localhost",
-        port=8000,
-        ssl=False
-    )
-    
-    # Create or get collection
-    collection = client.get_or_create_collection("pdf_chunks_collection")
-
-    for idx, chunk in enumerate(chunks):
-        collection.add(
-            ids=[f"chunk_{idx}"],
-            metadatas=[{"chunk_index": idx}],
-            documents=[chunk],
-            embeddings=[embeddings[idx].tolist()],
-        )
+    collection = get_collection()
+
+    with BulkWriter(collection) as writer:
+        for idx, chunk in enumerate(chunks):
+            writer.add(f"chunk_{idx}", chunk, {"chunk_index": idx}, embeddings[idx])
 
     print(f"{len(chunks)} chunks successfully added to ChromaDB!")
 
 
-# Main Workflow
-def main():
-    pdf_path = "420 Medical Terminology Certificate.pdf"
+# Streaming Workflow: Steps 1-4 page by page, embedding and storing fixed-size batches
+# as they fill up, so peak memory does not grow with the size of the PDF
+def stream_pdf_to_chromadb(pdf_path, batch_size=256, chunker="structured"):
+    collection = get_collection()
+    file_metadata = ingest_metadata(pdf_path)
 
-    # Step 1: Extract text
-    text_pages = extract_text_from_pdf(pdf_path)
+    chunks = chunk_pages(iter_pages(pdf_path), chunker)
+    chunk_idx = 0
+    with BulkWriter(collection) as writer:
+        for batch in iter_batches(chunks, batch_size):
+            embeddings = generate_embeddings([chunk.text for chunk in batch])
+            for chunk, embedding in zip(batch, embeddings):
+                metadata = {"chunk_index": chunk_idx, **file_metadata, **chunk.metadata}
+                writer.add(f"chunk_{chunk_idx}", chunk.text, metadata, embedding)
+                chunk_idx += 1
+            writer.flush()
 
-    # Step 2: Chunk text
-    all_chunks = []
-    for page_text in text_pages:
-        all_chunks.extend(chunk_text(page_text))
+    print(f"{chunk_idx} chunks successfully added to ChromaDB!")
 
-    # Step 3: Generate embeddings
-    embeddings = generate_embeddings(all_chunks)
 
-    # Step 4: Store in ChromaDB
-    store_in_chromadb(all_chunks, embeddings)
+# Main Workflow
+def main(chunker="structured"):
+    pdf_path = "420 Medical Terminology Certificate.pdf"
+    stream_pdf_to_chromadb(pdf_path, chunker=chunker)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chunk, embed and store a PDF in ChromaDB.")
+    parser.add_argument("--chunker", choices=["structured", "fixed"], default="structured",
+                        help="cross-page sentence/heading-aware chunks, or fixed 1000-character chunks per page")
+    parser.add_argument("--store", choices=["chroma", "local"], default=get_backend(),
+                        help="Chroma server, or the in-process local vector index (no server needed)")
+    args = parser.parse_args()
+    configure(backend=args.store)
+    main(chunker=args.chunker)
@@ -0,0 +1,173 @@
+from text_chunker.text_chunker import count_words
+
+DEFAULT_CONTEXT_TOKENS = 1500
+MIN_OVERLAP_CHARS = 20  # shorter suffix/prefix matches are treated as coincidence
+
+
+def _position(hit):
+    metadata = hit.get("metadata") or {}
+    return metadata.get("source_file"), metadata.get("chunk_index")
+
+
+def expand_neighbours(collection, hits_lists, window=1):
+    """Add the `window` chunks before and after every hit, fetched with one batched `get`.
+
+    Neighbours are looked up by (source_file, chunk_index) metadata, so this works
+    whatever id scheme the ingestion script used. Added hits have distance None and
+    `neighbour: True`.
+    """
+    if window <= 0:
+        return hits_lists
+    wanted = {}  # source_file -> chunk indexes not already retrieved
+    present = {_position(hit) for hits in hits_lists for hit in hits}
+    for hits in hits_lists:
+        for hit in hits:
+            source_file, idx = _position(hit)
+            if source_file is None or idx is None:
+                continue
+            for neighbour in range(max(0, idx - window), idx + window + 1):
+                if (source_file, neighbour) not in present:
+                    wanted.setdefault(source_file, set()).add(neighbour)
+    if not wanted:
+        return hits_lists
+
+    conditions = [
+        {"$and": [{"source_file": source_file}, {"chunk_index": {"$in": sorted(indexes)}}]}
+        for source_file, indexes in wanted.items()
+    ]
+    where = conditions[0] if len(conditions) == 1 else {"$or": conditions}
+    results = collection.get(where=where, include=["documents", "metadatas"])
+    fetched = {}
+    for chunk_id, document, metadata in zip(results["ids"], results["documents"], results["metadatas"]):
+        hit = {"id": chunk_id, "document": document, "metadata": metadata, "distance": None, "neighbour": True}
+        fetched[_position(hit)] = hit
+
+    expanded = []
+    for hits in hits_lists:
+        extra, seen = [], {_position(hit) for hit in hits}
+        for hit in hits:
+            source_file, idx = _position(hit)
+            if idx is None:
+                continue
+            for neighbour in range(max(0, idx - window), idx + window + 1):
+                key = (source_file, neighbour)
+                if key in fetched and key not in seen:
+                    extra.append(fetched[key])
+                    seen.add(key)
+        expanded.append(hits + extra)
+    return expanded
+
+
+def _overlap(previous, following, expected=None):
+    """Length of the longest suffix of `previous` that `following` starts with.
+
+    `expected` (from the stored character offsets) is tried first; it is exact for the
+    fixed-size chunker. Structured chunks re-join lines, so their overlap is searched for.
+    """
+    limit = min(len(previous), len(following))
+    if expected and 0 < expected <= limit and previous.endswith(following[:expected]):
+        return expected
+    for length in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:length]):
+            return length
+    return 0
+
+
+def merge_runs(hits):
+    """Group hits by source file and merge contiguous chunk_index runs, dropping overlapping text.
+
+    Returns passages ordered by their best-ranked hit. Each passage is a dict with
+    source_file, first/last chunk index, page range, text and the rank of its best hit.
+    """
+    groups = {}
+    for rank, hit in enumerate(hits):
+        source_file, idx = _position(hit)
+        if idx is None:
+            # Nothing to merge with: keep the hit as its own passage
+            source_file, idx = hit["id"], 0
+        group = groups.setdefault(source_file, {})
+        if idx not in group:
+            group[idx] = (rank, hit)
+
+    passages = []
+    for source_file, group in groups.items():
+        run = None
+        for idx in sorted(group):
+            rank, hit = group[idx]
+            metadata = hit.get("metadata") or {}
+            text = hit.get("document") or ""
+            if run is not None and idx == run["last_chunk"] + 1:
+                expected = None
+                if metadata.get("start_char") is not None and run["end_char"] is not None:
+                    expected = run["end_char"] - metadata["start_char"]
+                if expected is not None and expected <= 0:
+                    # Offsets say the chunks don't overlap: keep both texts whole
+                    run["text"] += "\n" + text
+                else:
+                    run["text"] += text[_overlap(run["text"], text, expected):]
+                run["last_chunk"] = idx
+                run["end_char"] = metadata.get("end_char")
+                run["page_end"] = metadata.get("page_end", run["page_end"])
+                run["rank"] = min(run["rank"], rank)
+                run["chunks"] += 1
+                continue
+            run = {
+                "source_file": metadata.get("source_file", source_file),
+                "first_chunk": idx,
+                "last_chunk": idx,
+                "page_start": metadata.get("page_start"),
+                "page_end": metadata.get("page_end"),
+                "end_char": metadata.get("end_char"),
+                "rank": rank,
+                "chunks": 1,
+                "text": text,
+            }
+            passages.append(run)
+
+    passages.sort(key=lambda passage: passage["rank"])
+    for passage in passages:
+        passage.pop("end_char")
+    return passages
+
+
+def _truncate(text, max_tokens, count_tokens):
+    """Longest prefix of whole words within max_tokens."""
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+
+def assemble_context(hits, max_tokens=DEFAULT_CONTEXT_TOKENS, count_tokens=count_words):
+    """Build a token-budgeted context block for an LLM from retrieved hits.
+
+    Hits are merged into passages (see merge_runs) and added best-first until the
+    budget is used up; the last passage is cut at a word boundary if needed. Returns
+    {"text", "passages", "tokens"}; the text labels each passage with its file and pages.
+    """
+    blocks, used, included = [], 0, []
+    for passage in merge_runs(hits):
+        pages = ""
+        if passage["page_start"] is not None:
+            pages = f" (page {passage['page_start']})" if passage["page_start"] == passage["page_end"] else \
+                f" (pages {passage['page_start']}-{passage['page_end']})"
+        header = f"[{len(blocks) + 1}] {passage['source_file']}{pages}"
+        remaining = max_tokens - used - count_tokens(header)
+        if remaining <= 0:
+            break
+        text = passage["text"].strip()
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            text = _truncate(text, remaining, count_tokens)
+            tokens = count_tokens(text)
+            if not text:
+                break
+        blocks.append(f"{header}\n{text}")
+        used += tokens + count_tokens(header)
+        included.append({**passage, "text": text})
+    return {"text": "\n\n".join(blocks), "passages": included, "tokens": used}
@@ -0,0 +1,35 @@
+import fitz  # PyMuPDF for PDF
+import docx  # For DOCX files
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+
+def iter_pages(file_path):
+    """Yield the text of a PDF one page at a time; a DOCX is yielded as a single page."""
+    if file_path.endswith(".pdf"):
+        with fitz.open(file_path) as doc:
+            for page in doc:
+                yield page.get_text()
+    elif file_path.endswith(".docx"):
+        doc = docx.Document(file_path)
+        yield "\n".join(paragraph.text for paragraph in doc.paragraphs)
+    else:
+        raise ValueError(f"Unsupported file type: {file_path}")
+
+
+def extract_pages(file_path):
+    """Return the text of a PDF page by page; a DOCX is returned as a single page."""
+    return list(iter_pages(file_path))
+
+
+def extract_text(file_path):
+    """Return the full text of a PDF or DOCX file."""
+    return " ".join(extract_pages(file_path))
+
+
+def extract_pages_safe(file_path):
+    """Process-pool friendly wrapper: returns (file_path, pages, error)."""
+    try:
+        return file_path, extract_pages(file_path), None
+    except Exception as e:
+        return file_path, None, str(e)
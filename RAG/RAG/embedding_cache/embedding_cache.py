@@ -0,0 +1,162 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+from embedding_models.embedding_models import DEFAULT_MODEL_NAME, get_model
+from quantization.quantization import check_dtype, from_bytes, to_bytes
+
+# Lives next to processed_files.log / content_hashes.log
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "embedding_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 200_000
+# float32, float16 or int8 (see quantization); applies to vectors written from now on
+DEFAULT_DTYPE = os.environ.get("RAG_EMBEDDING_CACHE_DTYPE", "float32")
+
+
+def chunk_hash(text):
+    """Content address of a chunk of text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model name, chunk hash) with LRU eviction.
+
+    Vectors are written as `dtype` (float16 halves the file, int8 quarters it) and
+    always returned as float32. Each row records its own dtype, so changing the
+    setting never invalidates entries that are already cached.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, dtype=DEFAULT_DTYPE):
+        self.path = path
+        self.max_entries = max_entries
+        self.dtype = check_dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model_name TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model_name, text_hash)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]
+        if "dtype" not in columns:
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float32'")
+        self._conn.commit()
+
+    def get_many(self, model_name, hashes):
+        """Return {hash: vector} for the hashes present in the cache."""
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector, dtype FROM embeddings WHERE model_name = ? "
+                    f"AND text_hash IN ({','.join('?' * len(part))})",
+                    [model_name, *part],
+                ).fetchall()
+                for text_hash, vector, dtype in rows:
+                    found[text_hash] = from_bytes(vector, dtype)
+            if found:
+                now = time.time_ns()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model_name = ? AND text_hash = ?",
+                    [(now, model_name, text_hash) for text_hash in found],
+                )
+                self._conn.commit()
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model_name, hashes, vectors):
+        """Store vectors for the given hashes, evicting the least recently used entries if full."""
+        now = time.time_ns()
+        rows = [
+            (model_name, text_hash, to_bytes(vector, self.dtype), now, self.dtype)
+            for text_hash, vector in zip(hashes, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model_name, text_hash, vector, last_used, dtype) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, vector_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "vector_bytes": vector_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+
+# model.encode options that do not change the vectors, so cached vectors stay valid
+CACHE_SAFE_ENCODE_KWARGS = ("batch_size", "show_progress_bar")
+
+
+def get_default_cache():
+    """Process-wide cache at DEFAULT_CACHE_PATH."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
+
+
+def encode_with_cache(chunks, model_name=DEFAULT_MODEL_NAME, cache=None, **encode_kwargs):
+    """Encode chunks, only running the model for chunks not already in the cache.
+
+    The cache is keyed by model and text only, so just the encode_kwargs in
+    CACHE_SAFE_ENCODE_KWARGS are accepted.
+    """
+    unsafe = sorted(set(encode_kwargs) - set(CACHE_SAFE_ENCODE_KWARGS))
+    if unsafe:
+        raise TypeError(f"encode_with_cache does not support encode options that change the vectors: {unsafe}")
+    cache = cache or get_default_cache()
+    hashes = [chunk_hash(chunk) for chunk in chunks]
+    found = cache.get_many(model_name, hashes)
+
+    missing = {}
+    for chunk, text_hash in zip(chunks, hashes):
+        if text_hash not in found:
+            missing.setdefault(text_hash, chunk)
+    if missing:
+        model = get_model(model_name)
+        new_vectors = model.encode(list(missing.values()), **encode_kwargs)
+        cache.put_many(model_name, list(missing), new_vectors)
+        found.update(zip(missing, (np.asarray(v, dtype=np.float32) for v in new_vectors)))
+
+    if not chunks:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([found[text_hash] for text_hash in hashes])
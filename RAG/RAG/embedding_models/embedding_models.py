@@ -0,0 +1,73 @@
+import threading
+import time
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_CROSS_ENCODER_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Loaded models keyed by (model_name, device, precision), shared by every caller in the process
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def get_model(model_name=DEFAULT_MODEL_NAME, device=None, precision="float32"):
+    """Return the shared SentenceTransformer for this key, loading it on first use."""
+    if precision not in ("float32", "float16"):
+        raise ValueError(f"Unsupported precision: {precision}")
+
+    key = (model_name, device, precision)
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            _stats[key]["hits"] += 1
+            return model
+
+        start = time.perf_counter()
+        model = SentenceTransformer(model_name, device=device)
+        if precision == "float16":
+            model = model.half()
+        _models[key] = model
+        _stats[key] = {
+            "model_name": model_name,
+            "device": str(model.device),
+            "precision": precision,
+            "load_seconds": time.perf_counter() - start,
+            "hits": 0,
+        }
+        return model
+
+
+def get_cross_encoder(model_name=DEFAULT_CROSS_ENCODER_NAME, device="cpu"):
+    """Return the shared CrossEncoder (used for re-ranking), loading it on first use."""
+    key = ("cross-encoder", model_name, device)
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            _stats[key]["hits"] += 1
+            return model
+
+        start = time.perf_counter()
+        model = CrossEncoder(model_name, device=device)
+        _models[key] = model
+        _stats[key] = {
+            "model_name": model_name,
+            "device": device,
+            "precision": "float32",
+            "load_seconds": time.perf_counter() - start,
+            "hits": 0,
+        }
+        return model
+
+
+def model_stats():
+    """Load time and reuse count for every model loaded in this process."""
+    with _lock:
+        return [dict(stats) for stats in _stats.values()]
+
+
+def clear_models():
+    """Drop all cached models, e.g. to free memory between benchmark runs."""
+    with _lock:
+        _models.clear()
+        _stats.clear()
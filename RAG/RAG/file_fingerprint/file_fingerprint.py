@@ -0,0 +1,85 @@
+import hashlib
+import os
+import time
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+BLOCK_SIZE = 1 << 20
+
+
+def stat_key(file_path):
+    """Cheap fingerprint from the file system: (size, mtime_ns, inode)."""
+    st = os.stat(file_path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def hash_file(file_path, block_size=BLOCK_SIZE):
+    """Hash the raw bytes of a file in fixed-size blocks (xxhash if installed, else blake2b)."""
+    hasher = xxhash.xxh3_128() if xxhash else hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def ingest_metadata(file_path, file_hash=None):
+    """Metadata stored on every chunk of a file: name, raw bytes hash and ingestion time (Unix seconds)."""
+    return {
+        "source_file": os.path.basename(file_path),
+        "file_hash": file_hash or hash_file(file_path),
+        "ingested_at": int(time.time()),
+    }
+
+
+class FileFingerprints:
+    """Tracks which files changed since they were last processed.
+
+    A file counts as unchanged when its stat key matches, or when the stat key moved
+    but the raw bytes hash is the same (e.g. the file was touched or copied back).
+    Text extracted elsewhere (e.g. prefetched by a worker process) can be kept for
+    the current version with set_text until the file is synced.
+    """
+
+    def __init__(self):
+        self._entries = {}  # file_path -> {"stat": ..., "hash": ..., "synced_hash": ...}
+        self._texts = {}
+
+    def has_changed(self, file_path):
+        """Return True if the file differs from the last version marked as synced."""
+        key = stat_key(file_path)
+        entry = self._entries.setdefault(file_path, {"stat": None, "hash": None, "synced_hash": None})
+        if entry["stat"] != key:
+            new_hash = hash_file(file_path)
+            if new_hash != entry["hash"]:
+                self._texts.pop(file_path, None)
+            entry["stat"], entry["hash"] = key, new_hash
+        return entry["hash"] != entry["synced_hash"]
+
+    def cached_text(self, file_path):
+        """Text already extracted for the current version, or None."""
+        return self._texts.get(file_path)
+
+    def set_text(self, file_path, text):
+        """Store text (or its list of pages) extracted elsewhere, e.g. in a worker process, for the current version."""
+        self._texts[file_path] = text
+
+    def mark_synced(self, file_path):
+        """Record the current version as processed and drop its cached text."""
+        entry = self._entries.get(file_path)
+        if entry:
+            entry["synced_hash"] = entry["hash"]
+        self._texts.pop(file_path, None)
+
+    def content_hash(self, file_path):
+        entry = self._entries.get(file_path)
+        return entry["hash"] if entry else None
+
+    def forget(self, file_path):
+        self._entries.pop(file_path, None)
+        self._texts.pop(file_path, None)
+
+    def tracked_files(self):
+        return set(self._entries)
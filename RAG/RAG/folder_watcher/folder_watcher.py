@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+MODIFIED = "modified"
+DELETED = "deleted"
+
+
+def is_document(file_name, extensions=(".pdf", ".docx")):
+    """True for documents we index; skips Office `~$` lock files and hidden/temp files."""
+    return file_name.endswith(extensions) and not file_name.startswith(("~", "."))
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path, MODIFIED)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path, MODIFIED)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path, DELETED)
+
+    def on_moved(self, event):
+        # Word and most editors save via a temp file that is renamed over the original
+        if not event.is_directory:
+            self.watcher.notify(event.src_path, DELETED)
+            self.watcher.notify(event.dest_path, MODIFIED)
+
+
+class FolderWatcher:
+    """Watches a folder with inotify (via watchdog) and feeds debounced changes to `handler`.
+
+    `handler(file_path, kind)` is called on a single worker thread, with `kind` either
+    MODIFIED or DELETED. A file is only handed over once no event arrived for `debounce`
+    seconds and its size stopped changing, so half-written files are not ingested.
+    """
+
+    def __init__(self, folder, handler, extensions=(".pdf", ".docx"), debounce=1.0, log=print):
+        if Observer is None:
+            raise ImportError("`watchdog` not installed. Please install using `pip install watchdog`.")
+        self.folder = folder
+        self.handler = handler
+        self.extensions = extensions
+        self.debounce = debounce
+        self.log = log
+
+        self._pending = {}  # file_path -> [kind, last_event_time, size]
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._observer = Observer()
+        self._threads = []
+
+    def notify(self, file_path, kind):
+        if not is_document(os.path.basename(file_path), self.extensions):
+            return
+        with self._lock:
+            self._pending[file_path] = [kind, time.monotonic(), self._size(file_path)]
+
+    @staticmethod
+    def _size(file_path):
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return None
+
+    def _debounce_loop(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            ready = []
+            with self._lock:
+                for file_path, entry in list(self._pending.items()):
+                    kind, last_event, size = entry
+                    if now - last_event < self.debounce:
+                        continue
+                    if kind == MODIFIED:
+                        current_size = self._size(file_path)
+                        if current_size != size:
+                            # Still being written, wait another debounce period
+                            entry[1], entry[2] = now, current_size
+                            continue
+                    del self._pending[file_path]
+                    ready.append((file_path, kind))
+            for item in ready:
+                self._queue.put(item)
+            self._stop.wait(min(self.debounce / 4, 0.25))
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                file_path, kind = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.handler(file_path, kind)
+            except Exception as e:
+                self.log(f"Error handling {kind} event for {file_path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        self._observer.schedule(_EventHandler(self), self.folder, recursive=False)
+        self._observer.start()
+        for target in (self._debounce_loop, self._worker_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.log(f"Watching {self.folder} for changes...")
+
+    def stop(self):
+        self._stop.set()
+        self._observer.stop()
+        self._observer.join()
+        for thread in self._threads:
+            thread.join()
+
+    def run_forever(self):
+        """Start watching and block until interrupted (daemon mode)."""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.log("Watcher stopped by user")
+        finally:
+            self.stop()
@@ -0,0 +1,98 @@
+from chroma_writer.chroma_writer import BulkWriter, bump_collection_version
+from embedding_cache.embedding_cache import chunk_hash, encode_with_cache
+from sparse_index.sparse_index import get_bm25_index
+from text_chunker.text_chunker import iter_batches
+from vector_store.vector_store import collection_key
+
+DEFAULT_BATCH_SIZE = 256
+
+_MISSING = object()
+
+
+def chunk_id(file_name, idx):
+    return f"{file_name}_chunk_{idx}"
+
+
+def fetch_stored_metadata(collection, file_name):
+    """Return {chunk_index: metadata} for everything stored for a file, in one request."""
+    results = collection.get(where={"source_file": file_name}, include=["metadatas"])
+    return {metadata["chunk_index"]: metadata for metadata in results["metadatas"]}
+
+
+def fetch_stored_hashes(collection, file_name):
+    """Return {chunk_index: chunk_hash} for everything stored for a file, in one request."""
+    # Chunks written before hashes were stored map to None and count as changed
+    return {idx: metadata.get("chunk_hash") for idx, metadata in fetch_stored_metadata(collection, file_name).items()}
+
+
+def sync_file(collection, file_name, chunks, embed=encode_with_cache, batch_size=DEFAULT_BATCH_SIZE, log=print,
+              file_metadata=None):
+    """Bring the stored chunks of a file in line with `chunks`, embedding only what changed.
+
+    `chunks` may be any iterable, including a generator streaming chunks out of a huge
+    document: changed chunks are embedded and written `batch_size` at a time, so neither
+    the full chunk list nor the full embedding matrix is ever held in memory.
+    Items are chunk strings or (text, metadata) pairs such as text_chunker.Chunk, whose
+    metadata (page range, section, ...) is stored alongside the chunk. `file_metadata`
+    (e.g. file_fingerprint.ingest_metadata) is added to every chunk.
+    A chunk whose text is unchanged is not re-embedded, but if its metadata moved
+    (offsets or pages after an edit, new file stamps) only the metadata is updated.
+    Returns counts of added, updated, unchanged, refreshed (unchanged text, new
+    metadata) and removed chunks.
+    """
+    stored = fetch_stored_metadata(collection, file_name)
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "refreshed": 0, "removed": 0}
+
+    def changed_chunks(writer):
+        total = 0
+        for idx, item in enumerate(chunks):
+            total = idx + 1
+            chunk, extra = (item, None) if isinstance(item, str) else item
+            metadata = {**(file_metadata or {}), "chunk_index": idx, "source_file": file_name, "chunk_hash": chunk_hash(chunk)}
+            if extra:
+                metadata.update(extra)
+            stored_metadata = stored.get(idx, _MISSING)
+            if stored_metadata is _MISSING:
+                stats["added"] += 1
+            elif stored_metadata.get("chunk_hash") != metadata["chunk_hash"]:
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+                # Keys no longer written are left alone, so only compare the new ones
+                if any(stored_metadata.get(key) != value for key, value in metadata.items()):
+                    stats["refreshed"] += 1
+                    writer.update_metadata(chunk_id(file_name, idx), metadata)
+                continue
+            yield idx, chunk, metadata
+        stats["total"] = total
+
+    with BulkWriter(collection, log=log) as writer:
+        for batch in iter_batches(changed_chunks(writer), batch_size):
+            embeddings = embed([chunk for _, chunk, _ in batch])
+            if len(embeddings) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings for {file_name}, got {len(embeddings)}")
+            for (idx, chunk, metadata), embedding in zip(batch, embeddings):
+                writer.add(chunk_id(file_name, idx), chunk, metadata, embedding)
+            # Write each batch as soon as it is embedded
+            writer.flush()
+
+    # The file shrank: drop the trailing chunks that no longer exist
+    total = stats.pop("total")
+    removed = sorted(idx for idx in stored if idx >= total)
+    if removed:
+        removed_ids = [chunk_id(file_name, idx) for idx in removed]
+        collection.delete(ids=removed_ids)
+        get_bm25_index(collection_key(collection)).delete(ids=removed_ids)
+        bump_collection_version(collection)
+    stats["removed"] = len(removed)
+
+    log(f"Synced {file_name}: {stats['added']} added, {stats['updated']} updated, "
+        f"{stats['removed']} removed, {stats['unchanged']} unchanged ({stats['refreshed']} with new metadata)")
+    return stats
+
+
+def remove_file_chunks(collection, file_name):
+    """Delete every stored chunk of a file that no longer exists."""
+    collection.delete(where={"source_file": file_name})
+    get_bm25_index(collection_key(collection)).delete(source_file=file_name)
+    bump_collection_version(collection)
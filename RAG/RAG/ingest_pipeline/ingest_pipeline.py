@@ -0,0 +1,171 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from chroma_writer.chroma_writer import BulkWriter
+from document_loader.document_loader import extract_pages_safe
+from embedding_cache.embedding_cache import chunk_hash, encode_with_cache
+from embedding_models.embedding_models import DEFAULT_MODEL_NAME
+from file_fingerprint.file_fingerprint import ingest_metadata
+
+DEFAULT_EMBED_BATCH_SIZE = 256
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def _extract(file_path):
+    """Worker task: pages plus file metadata, so hashing the file also runs in the pool."""
+    file_path, pages, error = extract_pages_safe(file_path)
+    return file_path, pages, error, None if error else ingest_metadata(file_path)
+
+
+class _Writer(threading.Thread):
+    """Background thread draining embedded batches into Chroma."""
+
+    def __init__(self, collection, batches, on_file_done, log):
+        super().__init__(daemon=True)
+        self.collection = collection
+        self.batches = batches
+        self.on_file_done = on_file_done
+        self.log = log
+        self.error = None
+        self.stats = {}
+
+    def run(self):
+        writer = BulkWriter(self.collection, log=self.log)
+        while True:
+            item = self.batches.get()
+            if item is _DONE:
+                break
+            if self.error:
+                # Keep draining so the producer never blocks on a full queue
+                continue
+            try:
+                ids, documents, metadatas, embeddings, finished_files = item
+                writer.add_many(ids, documents, metadatas, embeddings)
+                writer.flush()
+                for file_name in finished_files:
+                    self.on_file_done(file_name)
+            except Exception as e:
+                self.error = e
+        if not self.error:
+            try:
+                self.stats = writer.close()
+            except Exception as e:
+                self.error = e
+
+
+def run_pipeline(
+    file_paths,
+    collection,
+    chunk_pages,
+    workers=None,
+    model_name=DEFAULT_MODEL_NAME,
+    embed_batch_size=DEFAULT_EMBED_BATCH_SIZE,
+    queue_size=DEFAULT_QUEUE_SIZE,
+    on_file_done=lambda file_name: None,
+    log=print,
+    cache=None,
+):
+    """Ingest many files through a staged pipeline.
+
+    Stages: text extraction in a process pool -> chunking as each file arrives ->
+    embedding in cross-file batches on the shared model -> upserts on a background
+    thread. At most `2 * workers` files are extracted ahead of the embedder and at most
+    `queue_size` embedded batches wait for the writer, so memory stays bounded.
+
+    `chunk_pages(pages)` turns a list of page strings into chunks: strings or
+    (text, metadata) pairs such as text_chunker.Chunk.
+    `on_file_done(file_name)` is called once all chunks of a file are stored.
+    `cache` is the EmbeddingCache to use (default: the shared one).
+    """
+    workers = workers or default_workers()
+    start = time.perf_counter()
+    batches = queue.Queue(maxsize=queue_size)
+    writer = _Writer(collection, batches, on_file_done, log)
+    writer.start()
+
+    stats = {"files": 0, "failed": 0, "pages": 0, "chunks": 0}
+    buffer = []  # (file_name, idx, chunk)
+    file_metadatas = {}  # file_name -> ingest_metadata, until the file is emitted
+    finished_files = []
+
+    def emit():
+        if writer.error:
+            raise writer.error
+        chunks, metadatas = [], []
+        for file_name, idx, item in buffer:
+            chunk, extra = (item, None) if isinstance(item, str) else item
+            chunks.append(chunk)
+            metadatas.append({
+                "chunk_index": idx, "chunk_hash": chunk_hash(chunk), **file_metadatas[file_name], **(extra or {}),
+            })
+        embeddings = encode_with_cache(chunks, model_name, cache) if chunks else []
+        batches.put((
+            [f"{file_name}_chunk_{idx}" for file_name, idx, _ in buffer],
+            chunks,
+            metadatas,
+            embeddings,
+            list(finished_files),
+        ))
+        for file_name in finished_files:
+            file_metadatas.pop(file_name, None)
+        buffer.clear()
+        finished_files.clear()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending_paths = iter(file_paths)
+            in_flight = set()
+            while True:
+                while len(in_flight) < 2 * workers:
+                    file_path = next(pending_paths, None)
+                    if file_path is None:
+                        break
+                    in_flight.add(pool.submit(_extract, file_path))
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path, pages, error, file_metadata = future.result()
+                    file_name = os.path.basename(file_path)
+                    if error:
+                        log(f"Error extracting text from {file_name}: {error}")
+                        stats["failed"] += 1
+                        continue
+                    file_metadatas[file_name] = file_metadata
+
+                    for idx, item in enumerate(chunk_pages(pages)):
+                        buffer.append((file_name, idx, item))
+                        stats["chunks"] += 1
+                        if len(buffer) >= embed_batch_size:
+                            emit()
+                    finished_files.append(file_name)
+                    stats["files"] += 1
+                    stats["pages"] += len(pages)
+
+        if buffer or finished_files:
+            emit()
+    finally:
+        batches.put(_DONE)
+        writer.join()
+
+    if writer.error:
+        raise writer.error
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["chunks_per_sec"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["writer"] = writer.stats
+    log(
+        f"Ingested {stats['files']} files ({stats['pages']} pages, {stats['chunks']} chunks) "
+        f"in {stats['seconds']:.1f}s ({stats['chunks_per_sec']:.1f} chunks/sec) with {workers} workers"
+    )
+    return stats
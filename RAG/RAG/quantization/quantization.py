@@ -0,0 +1,54 @@
+import numpy as np
+
+# Storage types for embeddings: full precision, half precision, or int8 codes with one float32 scale per vector
+DTYPES = ("float32", "float16", "int8")
+
+
+def check_dtype(dtype):
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown embedding dtype: {dtype}")
+    return dtype
+
+
+def quantize(vectors, dtype):
+    """Return (codes, scales) for a 2-D float array; scales is None unless dtype is int8.
+
+    int8 uses symmetric scalar quantization per vector: codes = round(v / scale) with
+    scale = max(|v|) / 127, so every vector keeps its own range.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if check_dtype(dtype) == "float32":
+        return vectors, None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize(codes, scales, dtype):
+    """Float32 approximation of quantized vectors."""
+    if check_dtype(dtype) == "int8":
+        return codes.astype(np.float32) * scales[:, None]
+    return np.asarray(codes, dtype=np.float32)
+
+
+def to_bytes(vector, dtype):
+    """Serialize one vector; int8 vectors are prefixed with their float32 scale."""
+    codes, scales = quantize(np.asarray(vector, dtype=np.float32)[None, :], dtype)
+    if dtype == "int8":
+        return scales.tobytes() + codes.tobytes()
+    return codes.tobytes()
+
+
+def from_bytes(blob, dtype):
+    """Inverse of to_bytes, returning a float32 vector."""
+    if check_dtype(dtype) == "int8":
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)
+        return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale[0]
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32)
+
+
+def bytes_per_vector(dim, dtype):
+    return {"float32": 4 * dim, "float16": 2 * dim, "int8": dim + 4}[check_dtype(dtype)]
@@ -0,0 +1,95 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from chroma_writer.chroma_writer import get_collection_version
+from vector_store.vector_store import collection_key
+
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation don't change what is being asked."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+def embedding_hash(embedding):
+    return hashlib.blake2b(np.asarray(embedding, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit/miss counters."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryCache:
+    """Two-level cache for question answering.
+
+    Level 1 maps a normalized question to its embedding, so repeated questions skip the
+    model. Level 2 maps (collection, collection version, embedding hash, n_results) to the
+    retrieved hits, so repeated questions skip ChromaDB. The collection version is bumped
+    by every ingestion write, which makes stale results unreachable.
+    """
+
+    def __init__(self, max_embeddings=10_000, max_results=10_000):
+        self.embeddings = LRUCache(max_embeddings)
+        self.results = LRUCache(max_results)
+
+    def encode(self, questions, model, **encode_kwargs):
+        """Embeddings for questions, encoding only the ones not seen before (in one batch)."""
+        keys = [normalize_question(question) for question in questions]
+        vectors = [self.embeddings.get(key) for key in keys]
+        missing = {}
+        for key, question, vector in zip(keys, questions, vectors):
+            if vector is None:
+                missing.setdefault(key, question)
+        if missing:
+            new_vectors = dict(zip(missing, model.encode(list(missing.values()), **encode_kwargs)))
+            for key, vector in new_vectors.items():
+                self.embeddings.put(key, vector)
+            vectors = [new_vectors[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def result_keys(self, collection, embeddings, n_results, *extra):
+        """Result cache keys; `extra` covers anything else that changes the answer (filters, ...)."""
+        version = get_collection_version(collection)
+        return [(collection_key(collection), version, embedding_hash(embedding), n_results, *extra) for embedding in embeddings]
+
+    def stats(self):
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
@@ -0,0 +1,270 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Shared helpers live in sibling folders under RAG/RAG
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chroma_questioning.chroma_questioning import RETRIEVAL_MODES, read_questions, retrieve
+from chroma_writer.chroma_writer import configure as configure_versions
+from document_loader.document_loader import SUPPORTED_EXTENSIONS
+from embedding_cache.embedding_cache import EmbeddingCache
+from embedding_models.embedding_models import DEFAULT_MODEL_NAME, get_model
+from ingest_pipeline.ingest_pipeline import run_pipeline
+from reranker.reranker import DEFAULT_FETCH_K, Reranker
+from sparse_index.sparse_index import configure as configure_bm25, get_bm25_index
+from text_chunker.text_chunker import (DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, iter_page_chunks,
+                                       iter_structured_chunks)
+from vector_store.vector_store import collection_key, configure, delete_collection, open_collection
+
+CORPUS_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_QUESTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.jsonl")
+BENCHMARK_COLLECTION = "rag_benchmark"
+K_VALUES = (1, 3, 5)
+REPORT_VERSION = 1
+
+
+def corpus_files(directory):
+    """PDF/DOCX files of a folder, without Word's ~$ lock files."""
+    return [
+        path for path in sorted(glob.glob(os.path.join(directory, "*")))
+        if path.endswith(SUPPORTED_EXTENSIONS) and not os.path.basename(path).startswith("~$")
+    ]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def is_relevant(hit, record):
+    """A hit is relevant if its id is listed in expected_ids or it contains expected_text."""
+    if hit["id"] in record.get("expected_ids", ()):
+        return True
+    expected_text = record.get("expected_text")
+    return bool(expected_text) and _normalize(expected_text) in _normalize(hit["document"])
+
+
+def first_relevant_rank(hits, record):
+    for rank, hit in enumerate(hits, start=1):
+        if is_relevant(hit, record):
+            return rank
+    return None
+
+
+def make_chunker(args):
+    if args.chunker == "fixed":
+        return lambda pages: iter_page_chunks(pages, args.chunk_size, args.overlap)
+    return lambda pages: iter_structured_chunks(pages, args.max_tokens, args.overlap_tokens)
+
+
+def build_collection(files, chunk_pages, model_name, workers=None, warm_cache=False, log=print):
+    """Ingest the corpus into a fresh benchmark collection; returns (collection, ingest stats)."""
+    try:
+        delete_collection(BENCHMARK_COLLECTION)
+    except Exception:
+        pass
+    collection = open_collection(BENCHMARK_COLLECTION)
+    get_bm25_index(collection_key(collection)).clear()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # A throw-away embedding cache, so every run pays for encoding like a first ingest
+        cache = None if warm_cache else EmbeddingCache(os.path.join(directory, "embedding_cache.sqlite"))
+        stats = run_pipeline(files, collection, chunk_pages, workers=workers, model_name=model_name, log=log, cache=cache)
+        if cache is not None:
+            cache.close()
+
+    seconds = stats["seconds"]
+    return collection, {
+        "files": stats["files"],
+        "failed": stats["failed"],
+        "pages": stats["pages"],
+        "chunks": stats["chunks"],
+        "seconds": seconds,
+        "pages_per_sec": stats["pages"] / seconds if seconds else 0.0,
+        "chunks_per_sec": stats["chunks"] / seconds if seconds else 0.0,
+    }
+
+
+def evaluate(records, collection, model, k_values=K_VALUES, mode="dense", reranker=None):
+    """Ask every question on its own, as ask_question does, then all of them in one batch.
+
+    Returns recall@k for each k, MRR over the top max(k), single-question latency
+    percentiles, batch throughput and the rank of the first relevant hit per question.
+    """
+    n_results = max(k_values)
+    retrieve(["warm up"], collection, model, n_results, mode=mode, reranker=reranker)
+
+    latencies, per_question = [], []
+    for record in records:
+        start = time.perf_counter()
+        hits = retrieve([record["question"]], collection, model, n_results, mode=mode, reranker=reranker)[0]
+        latency_ms = (time.perf_counter() - start) * 1000
+        latencies.append(latency_ms)
+        per_question.append({"id": record["id"], "rank": first_relevant_rank(hits, record), "latency_ms": latency_ms})
+
+    start = time.perf_counter()
+    retrieve([record["question"] for record in records], collection, model, n_results, mode=mode, reranker=reranker)
+    batch_seconds = time.perf_counter() - start
+
+    ranks = [result["rank"] for result in per_question]
+    n = len(records) or 1
+    retrieval = {f"recall@{k}": sum(1 for rank in ranks if rank is not None and rank <= k) / n for k in k_values}
+    retrieval["mrr"] = sum(1 / rank for rank in ranks if rank is not None) / n
+    latency = {
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+        "p50": percentile(latencies, 0.50) if latencies else None,
+        "p95": percentile(latencies, 0.95) if latencies else None,
+        "p99": percentile(latencies, 0.99) if latencies else None,
+    }
+    batch = {"questions_per_sec": len(records) / batch_seconds if batch_seconds else 0.0}
+    return retrieval, latency, batch, per_question
+
+
+def _rounded(value):
+    if isinstance(value, float):
+        return round(value, 4)
+    if isinstance(value, dict):
+        return {key: _rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rounded(item) for item in value]
+    return value
+
+
+def _metrics(report):
+    """Flatten the numeric sections of a report to {"section.metric": value}."""
+    flat = {}
+    for section in ("ingest", "retrieval", "latency_ms", "batch"):
+        for key, value in report.get(section, {}).items():
+            if isinstance(value, (int, float)):
+                flat[f"{section}.{key}"] = value
+    if report.get("peak_rss_mb") is not None:
+        flat["peak_rss_mb"] = report["peak_rss_mb"]
+    return flat
+
+
+def compare(report, baseline, log=print):
+    """Print every metric next to its value in a previous report."""
+    old = _metrics(baseline)
+    for key, value in _metrics(report).items():
+        if key in old:
+            log(f"{key:<28} {old[key]:>12.4f} -> {value:>12.4f} ({value - old[key]:+.4f})")
+        else:
+            log(f"{key:<28} {'':>12} -> {value:>12.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a collection from the sample corpus and score retrieval on labeled questions.")
+    parser.add_argument("--corpus", default=CORPUS_DIRECTORY, help="folder of PDF/DOCX files")
+    parser.add_argument("--questions-file", default=DEFAULT_QUESTIONS_FILE,
+                        help="JSONL of questions with expected_text (or expected_ids)")
+    parser.add_argument("--chunker", choices=["fixed", "structured"], default="fixed",
+                        help="chunk_text-style fixed windows, or sentence-aware token chunks")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="fixed chunker: characters per chunk")
+    parser.add_argument("--overlap", type=int, default=200, help="fixed chunker: overlapping characters")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="structured chunker: tokens per chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS, help="structured chunker: overlapping tokens")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="sentence-transformers embedding model")
+    parser.add_argument("--k", type=int, nargs="+", default=list(K_VALUES), help="cut-offs reported as recall@k")
+    parser.add_argument("--mode", choices=RETRIEVAL_MODES, default="dense")
+    parser.add_argument("--rerank", action="store_true", help="re-rank candidates with the cross-encoder")
+    parser.add_argument("--rerank-fetch-k", type=int, default=DEFAULT_FETCH_K)
+    parser.add_argument("--store", choices=["chroma", "local"], default="local",
+                        help="throw-away local index (default), or a benchmark collection on the Chroma server")
+    parser.add_argument("--workers", type=int, help="text extraction processes")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="use the shared embedding cache, measuring re-ingest instead of first ingest")
+    parser.add_argument("--output", default="rag_benchmark.json", help="where the JSON report is written")
+    parser.add_argument("--baseline", help="previous report to compare against")
+    args = parser.parse_args()
+
+    files = corpus_files(args.corpus)
+    if not files:
+        print(f"No PDF or DOCX files found in {args.corpus}")
+        return
+    records = list(read_questions(args.questions_file))
+    # Read before the report is written, so --baseline may name the --output file of the last run
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as index_directory:
+        # Step 1: Ingest the corpus into a fresh collection; the BM25 index and version stamps
+        # go to the temporary folder as well, so a run leaves nothing behind
+        configure(backend=args.store, directory=index_directory)
+        configure_bm25(directory=index_directory)
+        configure_versions(versions_directory=index_directory)
+        model = get_model(args.model)
+        collection, ingest = build_collection(files, make_chunker(args), args.model, args.workers, args.warm_cache)
+
+        # Step 2: Run the labeled questions
+        reranker = Reranker(fetch_k=args.rerank_fetch_k) if args.rerank else None
+        retrieval, latency, batch, per_question = evaluate(records, collection, model, args.k, args.mode, reranker)
+        if args.store == "local":
+            collection.close()
+        get_bm25_index(collection_key(collection)).close()
+
+    report = _rounded({
+        "report_version": REPORT_VERSION,
+        "config": {
+            "corpus": [os.path.basename(path) for path in files],
+            "questions_file": os.path.basename(args.questions_file),
+            "questions": len(records),
+            "chunker": args.chunker,
+            "chunk_size": args.chunk_size if args.chunker == "fixed" else None,
+            "overlap": args.overlap if args.chunker == "fixed" else None,
+            "max_tokens": args.max_tokens if args.chunker == "structured" else None,
+            "overlap_tokens": args.overlap_tokens if args.chunker == "structured" else None,
+            "model": args.model,
+            "k": args.k,
+            "mode": args.mode,
+            "rerank": args.rerank,
+            "store": args.store,
+            "warm_cache": args.warm_cache,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "ingest": ingest,
+        "retrieval": retrieval,
+        "latency_ms": latency,
+        "batch": batch,
+        "peak_rss_mb": peak_rss_mb(),
+        "per_question": per_question,
+    })
+
+    # Step 3: Write the report and show the headline numbers
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Report written to {args.output}")
+    compare(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import time
+
+from embedding_cache.embedding_cache import chunk_hash
+from embedding_models.embedding_models import DEFAULT_CROSS_ENCODER_NAME, get_cross_encoder
+from query_cache.query_cache import LRUCache, normalize_question
+from text_chunker.text_chunker import iter_batches
+
+DEFAULT_FETCH_K = 50  # dense/hybrid candidates re-ranked per question
+DEFAULT_BATCH_SIZE = 32  # (question, passage) pairs per CrossEncoder.predict call
+
+
+class Reranker:
+    """Re-orders retrieved candidates by CrossEncoder relevance scores.
+
+    Scores are cached per (normalized question, chunk id, chunk hash), so a repeated
+    question, or a chunk that shows up again for the same question, is not re-scored.
+    With `budget_ms`, scoring stops before the next batch would overrun the budget.
+    Questions whose candidates could not all be scored in time keep their original
+    (dense or hybrid) ranking.
+    """
+
+    def __init__(self, model_name=DEFAULT_CROSS_ENCODER_NAME, fetch_k=DEFAULT_FETCH_K, batch_size=DEFAULT_BATCH_SIZE,
+                 budget_ms=None, cache_size=50_000, device="cpu"):
+        self.model = get_cross_encoder(model_name, device)
+        self.fetch_k = fetch_k
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.scores = LRUCache(cache_size)
+        self.reranked = 0
+        self.fallbacks = 0
+        self._seconds_per_pair = None
+
+    def _score(self, question, documents):
+        start = time.perf_counter()
+        scores = self.model.predict([(question, document) for document in documents], batch_size=self.batch_size)
+        per_pair = (time.perf_counter() - start) / len(documents)
+        # Smoothed so one slow batch doesn't disable re-ranking for good
+        self._seconds_per_pair = per_pair if self._seconds_per_pair is None else 0.8 * self._seconds_per_pair + 0.2 * per_pair
+        return [float(score) for score in scores]
+
+    def rerank(self, questions, hits_lists, n_results=3):
+        """Return the top n_results of each candidate list, best CrossEncoder score first."""
+        deadline = time.perf_counter() + self.budget_ms / 1000 if self.budget_ms else None
+        results = []
+        for question, hits in zip(questions, hits_lists):
+            question_key = normalize_question(question)
+            # Chunks stored without a chunk_hash (e.g. by Auto_Chunk_Files or chunking.py) are keyed by their text
+            keys = [
+                (question_key, hit["id"], (hit.get("metadata") or {}).get("chunk_hash") or chunk_hash(hit["document"] or ""))
+                for hit in hits
+            ]
+            scores = [self.scores.get(key) for key in keys]
+            missing = [i for i, score in enumerate(scores) if score is None]
+
+            for batch in iter_batches(missing, self.batch_size):
+                # Don't start work that can't finish within the budget
+                if deadline is not None:
+                    estimate = (len(missing) if batch[0] == missing[0] else len(batch)) * (self._seconds_per_pair or 0.0)
+                    if time.perf_counter() + estimate > deadline:
+                        break
+                for i, score in zip(batch, self._score(question, [hits[i]["document"] or "" for i in batch])):
+                    scores[i] = score
+                    self.scores.put(keys[i], score)
+
+            if any(score is None for score in scores):
+                self.fallbacks += 1
+                results.append(hits[:n_results])
+                continue
+            self.reranked += 1
+            order = sorted(range(len(hits)), key=lambda i: scores[i], reverse=True)[:n_results]
+            results.append([{**hits[i], "rerank_score": scores[i]} for i in order])
+        return results
+
+    def stats(self):
+        return {
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "ms_per_pair": self._seconds_per_pair * 1000 if self._seconds_per_pair else None,
+            "score_cache": self.scores.stats(),
+        }
@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared helpers live in sibling folders under RAG/RAG
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chroma_questioning.chroma_questioning import RETRIEVAL_MODES, build_where, retrieve
+from embedding_models.embedding_models import get_model
+from query_cache.query_cache import QueryCache
+from reranker.reranker import DEFAULT_FETCH_K, Reranker
+from vector_store.vector_store import configure, get_backend, open_collection, validate_where
+
+MAX_BATCH_SIZE = 64  # questions merged into one encode call / multi-query request
+MAX_WAIT_MS = 5  # how long the first question of a batch waits for company
+MAX_PENDING = 1024  # queued questions before new requests get 503
+MAX_N_RESULTS = 100  # hits per question one request may ask for
+MAX_BODY_BYTES = 1 << 20
+LATENCY_WINDOW = 10_000  # requests kept for the percentiles
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Overloaded(Exception):
+    pass
+
+
+class LatencyStats:
+    """Rolling window of request latencies with percentiles."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+
+    def percentiles(self):
+        if not self.samples:
+            return {"p50": None, "p95": None, "p99": None}
+        ordered = sorted(self.samples)
+        pick = lambda p: round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+class MicroBatcher:
+    """Collects concurrent questions and answers them with one `retrieve` call per batch.
+
+    The model and ChromaDB calls block, so batches run one at a time on a single worker
+    thread; while one batch runs, the next one fills up. The queue is bounded: when
+    `max_pending` questions are waiting, `submit` raises Overloaded instead of queueing.
+    """
+
+    def __init__(self, collection, model, cache=None, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS, max_pending=MAX_PENDING, mode="dense", reranker=None):
+        self.collection = collection
+        self.model = model
+        self.cache = cache
+        self.mode = mode
+        self.reranker = reranker
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieve")
+        self.batches = 0
+        self.questions = 0
+        self.rejected = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, questions, n_results, where=None):
+        """Queue questions and wait for their hits (one list per question)."""
+        if self.queue.maxsize - self.queue.qsize() < len(questions):
+            self.rejected += 1
+            raise Overloaded(f"{self.queue.qsize()} questions already pending")
+        loop = asyncio.get_running_loop()
+        options = (n_results, json.dumps(where, sort_keys=True) if where else None)
+        futures = []
+        for question in questions:
+            future = loop.create_future()
+            self.queue.put_nowait((question, options, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Take whatever else arrived meanwhile without waiting any longer
+        while len(batch) < self.max_batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [item for item in await self._next_batch() if not item[2].cancelled()]
+            # A single retrieve call needs a single n_results and filter
+            by_options = {}
+            for item in batch:
+                by_options.setdefault(item[1], []).append(item)
+            for (n_results, where), items in by_options.items():
+                questions = [question for question, _, _ in items]
+                try:
+                    hits = await loop.run_in_executor(
+                        self.executor, retrieve, questions, self.collection, self.model, n_results,
+                        self.cache, self.mode, self.reranker, json.loads(where) if where else None,
+                    )
+                except Exception as e:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.questions += len(items)
+                for (_, _, future), question_hits in zip(items, hits):
+                    if not future.done():
+                        future.set_result(question_hits)
+
+    def stats(self):
+        return {
+            "pending": self.queue.qsize(),
+            "batches": self.batches,
+            "questions": self.questions,
+            "avg_batch_size": self.questions / self.batches if self.batches else 0.0,
+            "rejected_requests": self.rejected,
+        }
+
+
+class RetrievalService:
+    """Minimal HTTP/1.1 server in front of a MicroBatcher.
+
+    POST /ask    {"question": "...", "n_results": 3} or {"questions": [...]}, optionally
+                 scoped with "source_file", "pages": [first, last], "ingested_after" or "where"
+    GET  /stats  latency percentiles, batching and cache stats
+    GET  /health
+    """
+
+    def __init__(self, batcher, cache=None):
+        self.batcher = batcher
+        self.cache = cache
+        self.reranker = batcher.reranker
+        self.latency = LatencyStats()
+        self.started = time.time()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if isinstance(body, int):
+                    status, payload = body, {"error": _REASONS[body]}
+                else:
+                    status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return "", "", {"connection": "close"}, 400
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            headers["connection"] = "close"
+            return method, path, headers, 400
+        if length > MAX_BODY_BYTES:
+            headers["connection"] = "close"
+            return method, path, headers, 413
+        body = await reader.readexactly(length) if length else b""
+        return method, path.split("?", 1)[0], headers, body
+
+    async def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.stats()
+        if path != "/ask":
+            return 404, {"error": f"Unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST /ask"}
+
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("the body must be a JSON object")
+            single = "questions" not in request
+            if not single and not isinstance(request["questions"], list):
+                raise ValueError("questions must be a list")
+            questions = [request["question"]] if single else request["questions"]
+            n_results = int(request.get("n_results", 3))
+            if not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+                raise ValueError("questions must be non-empty strings")
+            if not 1 <= n_results <= MAX_N_RESULTS:
+                raise ValueError(f"n_results must be between 1 and {MAX_N_RESULTS}")
+            if request.get("where") is not None:
+                validate_where(request["where"])
+            where = build_where(request.get("source_file"), request.get("pages"), request.get("ingested_after"),
+                                request.get("where"))
+            if where is not None:
+                # Catches non-numeric pages / ingested_after too, before they reach the batch
+                validate_where(where)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"Invalid request: {e}"}
+
+        start = time.perf_counter()
+        try:
+            hits = await self.batcher.submit(questions, n_results, where)
+        except Overloaded as e:
+            return 503, {"error": f"Overloaded: {e}"}
+        except Exception as e:
+            return 500, {"error": str(e)}
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.latency.add(latency_ms)
+
+        if single:
+            return 200, {"question": questions[0], "hits": hits[0], "latency_ms": round(latency_ms, 3)}
+        return 200, {"results": [{"question": q, "hits": h} for q, h in zip(questions, hits)],
+                     "latency_ms": round(latency_ms, 3)}
+
+    def stats(self):
+        stats = {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": self.latency.count,
+            "latency_ms": self.latency.percentiles(),
+            "batching": self.batcher.stats(),
+        }
+        if self.cache:
+            stats["cache"] = self.cache.stats()
+        if self.reranker:
+            stats["rerank"] = self.reranker.stats()
+        return stats
+
+
+async def serve(collection, model, host="127.0.0.1", port=8080, cache=None, max_batch_size=MAX_BATCH_SIZE,
+                max_wait_ms=MAX_WAIT_MS, max_pending=MAX_PENDING, mode="dense", reranker=None):
+    batcher = MicroBatcher(collection, model, cache, max_batch_size, max_wait_ms, max_pending, mode, reranker)
+    service = RetrievalService(batcher, cache)
+    batcher.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Retrieval service listening on http://{host}:{port} (POST /ask, GET /stats)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+        print(f"Final stats: {json.dumps(service.stats())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ChromaDB retrieval over HTTP with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE, help="questions per encode/query call")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="how long to wait to fill a batch")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="queued questions before returning 503")
+    parser.add_argument("--no-cache", action="store_true", help="disable the question embedding and result caches")
+    parser.add_argument("--mode", choices=RETRIEVAL_MODES, default="dense",
+                        help="dense vector search, or dense fused with BM25 keyword search")
+    parser.add_argument("--rerank", action="store_true", help="re-rank candidates with a cross-encoder")
+    parser.add_argument("--rerank-fetch-k", type=int, default=DEFAULT_FETCH_K, help="candidates re-ranked per question")
+    parser.add_argument("--rerank-budget-ms", type=float,
+                        help="latency budget per batch for re-ranking; over budget, the dense/hybrid ranking is returned")
+    parser.add_argument("--store", choices=["chroma", "local"], default=get_backend(),
+                        help="Chroma server, or the in-process local vector index (no server needed)")
+    args = parser.parse_args()
+
+    # Connect and load the model once; every request reuses them
+    configure(backend=args.store)
+    collection = open_collection("pdf_chunks_collection", create=False)
+    model = get_model()
+    cache = None if args.no_cache else QueryCache()
+    reranker = Reranker(fetch_k=args.rerank_fetch_k, budget_ms=args.rerank_budget_ms) if args.rerank else None
+
+    try:
+        asyncio.run(serve(collection, model, args.host, args.port, cache, args.max_batch_size,
+                          args.max_wait_ms, args.max_pending, args.mode, reranker))
+    except KeyboardInterrupt:
+        print("Retrieval service stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import Counter
+
+# One BM25 index per collection and store (see vector_store.collection_key), next to processed_files.log
+INDEX_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bm25_indexes")
+_config = {"directory": INDEX_DIRECTORY}
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a about an and any are as at be been but by can could did do does for from had has have how i if in into is it "
+    "its me my no not of on or our so such that the their them then there these they this those to was we were what "
+    "when where which who whom why will with would you your".split()
+)
+
+# Open indexes keyed by path, shared by every writer and reader in the process
+_indexes = {}
+_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lower-cased word tokens without stopwords; medical terms are kept whole."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """Persistent BM25 inverted index of chunk texts, kept in SQLite.
+
+    Postings live on disk, keyed by (term, chunk id), and only the chunk lengths are held
+    in memory. A query reads the posting lists of its own terms. Chunks are added and
+    removed incrementally, so re-syncing one file never rebuilds the whole index.
+    Writes from another process are picked up on the next search (SQLite's data_version).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, source_file TEXT, length INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_source_file ON docs (source_file)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, id)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS postings_id ON postings (id)")
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        self._lengths = dict(self._db.execute("SELECT id, length FROM docs"))
+        self._total_length = sum(self._lengths.values())
+        self._seen_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _refresh(self):
+        if self._db.execute("PRAGMA data_version").fetchone()[0] != self._seen_version:
+            self._load()
+
+    def _remove(self, ids):
+        for chunk_id in ids:
+            length = self._lengths.pop(chunk_id, None)
+            if length is not None:
+                self._total_length -= length
+        self._db.executemany("DELETE FROM postings WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+        self._db.executemany("DELETE FROM docs WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+
+    def add_documents(self, ids, documents, metadatas=None):
+        """Index (or re-index) chunks; `metadatas` supplies `source_file` for file-level deletes."""
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            self._refresh()
+            self._remove([chunk_id for chunk_id in ids if chunk_id in self._lengths])
+            docs, postings = [], []
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                terms = Counter(tokenize(document or ""))
+                length = sum(terms.values())
+                docs.append((chunk_id, (metadata or {}).get("source_file"), length))
+                postings.extend((term, chunk_id, tf) for term, tf in terms.items())
+                self._lengths[chunk_id] = length
+                self._total_length += length
+            self._db.executemany("INSERT OR REPLACE INTO docs (id, source_file, length) VALUES (?, ?, ?)", docs)
+            self._db.executemany("INSERT OR REPLACE INTO postings (term, id, tf) VALUES (?, ?, ?)", postings)
+            self._db.commit()
+
+    def delete(self, ids=None, source_file=None):
+        with self._lock:
+            self._refresh()
+            ids = list(ids or [])
+            if source_file is not None:
+                ids += [row[0] for row in self._db.execute("SELECT id FROM docs WHERE source_file = ?", (source_file,))]
+            if ids:
+                self._remove(ids)
+                self._db.commit()
+
+    def search(self, query, n_results=10):
+        """Return [(chunk_id, score)] of the best BM25 matches, highest score first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            self._refresh()
+            n_docs = len(self._lengths)
+            if not terms or not n_docs:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            scores = Counter()
+            for term in terms:
+                postings = self._db.execute("SELECT id, tf FROM postings WHERE term = ?", (term,)).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths.get(chunk_id, 0) / avg_length)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores.most_common(n_results)
+
+    def document_frequency(self, term):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            n_docs = len(self._lengths)
+            return {
+                "documents": n_docs,
+                "terms": self._db.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0],
+                "avg_length": self._total_length / n_docs if n_docs else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM postings")
+            self._db.execute("DELETE FROM docs")
+            self._db.commit()
+            self._load()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def configure(directory=None):
+    """Select the folder get_bm25_index uses by default for the rest of the process."""
+    if directory is not None:
+        _config["directory"] = directory
+
+
+def get_bm25_index(key, directory=None):
+    """Return the process-wide BM25 index of a collection, opening it on first use.
+
+    `key` is `vector_store.collection_key(collection)`, so a Chroma and a local
+    collection with the same name keep separate indexes.
+    """
+    path = os.path.abspath(os.path.join(directory or _config["directory"], f"{key}.sqlite"))
+    with _lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = BM25Index(path)
+            _indexes[path] = index
+        return index
+
+
+def rebuild_from_collection(collection, index=None, page_size=1000, log=print):
+    """Re-index every chunk stored in a collection, e.g. data ingested before BM25 existed."""
+    from vector_store.vector_store import collection_key
+
+    index = index or get_bm25_index(collection_key(collection))
+    index.clear()
+    offset = 0
+    while True:
+        results = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+        if not results["ids"]:
+            break
+        index.add_documents(results["ids"], results["documents"], results["metadatas"])
+        offset += len(results["ids"])
+        log(f"Indexed {offset} chunks...")
+    log(f"BM25 index for {collection.name}: {index.stats()}")
+    return index
+
+
+if __name__ == "__main__":
+    # Shared helpers live in sibling folders under RAG/RAG
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from vector_store.vector_store import configure, get_backend, open_collection
+
+    parser = argparse.ArgumentParser(description="Rebuild the BM25 index of a collection from its stored chunks.")
+    parser.add_argument("collection", nargs="?", default="pdf_chunks_collection")
+    parser.add_argument("--store", choices=["chroma", "local"], default=get_backend(),
+                        help="Chroma server, or the in-process local vector index (no server needed)")
+    args = parser.parse_args()
+    configure(backend=args.store)
+    rebuild_from_collection(open_collection(args.collection, create=False))
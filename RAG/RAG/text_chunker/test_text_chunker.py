@@ -0,0 +1,21 @@
+from text_chunker import _split_long, count_words, iter_structured_chunks
+
+
+def test_split_long_measures_every_piece():
+    # Plain words first, then words worth 15 tokens each: the average density
+    # underestimates the tail, which has to be split again
+    text = " ".join(["word"] * 400 + ["a-b-c-d-e-f-g-h"] * 100) + "."
+    pieces = list(_split_long(text, 0, len(text), count_words, 250))
+
+    assert all(tokens == count_words(text[start:end]) for start, end, tokens in pieces)
+    assert all(tokens <= 250 for _, _, tokens in pieces)
+    assert " ".join(text[start:end] for start, end, _ in pieces) == text
+
+
+def test_structured_chunks_stay_within_max_tokens():
+    text = " ".join(["word"] * 400 + ["a-b-c-d-e-f-g-h"] * 100) + "."
+    chunks = list(iter_structured_chunks([text], max_tokens=250, overlap_tokens=40))
+
+    assert len(chunks) > 1
+    assert all(count_words(chunk.text) <= 250 for chunk in chunks)
+    assert chunks[-1].metadata["end_char"] == len(text)
@@ -0,0 +1,294 @@
+import bisect
+import itertools
+import re
+from typing import NamedTuple
+
+
+class Chunk(NamedTuple):
+    text: str
+    metadata: dict
+
+
+def validate_chunk_params(chunk_size, overlap):
+    """Reject settings that would never advance (overlap >= chunk_size) or make empty chunks."""
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+    if not 0 <= overlap < chunk_size:
+        raise ValueError(f"overlap must be in [0, chunk_size), got overlap={overlap}, chunk_size={chunk_size}")
+
+
+def iter_chunk_offsets(text_length, chunk_size=1000, overlap=200):
+    """Lazily yield (start, end) character offsets of fixed-size overlapping chunks.
+
+    Nothing is copied; slice the text with the offsets only when a chunk is needed.
+    """
+    validate_chunk_params(chunk_size, overlap)
+    step = chunk_size - overlap
+    for start in range(0, text_length, step):
+        yield start, min(start + chunk_size, text_length)
+
+
+def chunk_text(text, chunk_size=1000, overlap=200):
+    """Split text into fixed-size overlapping chunks."""
+    return [text[start:end] for start, end in iter_chunk_offsets(len(text), chunk_size, overlap)]
+
+
+def iter_chunks(pieces, chunk_size=1000, overlap=200, separator=" "):
+    """Yield fixed-size overlapping Chunks from a stream of text pieces (e.g. pages).
+
+    Produces the same text as `chunk_text(separator.join(pieces))` without joining the
+    pieces: memory is about one chunk plus one piece, and each character is copied a
+    constant number of times (once into the buffer, once per chunk it lands in), so
+    time is linear in the total length. Each chunk records its `start_char` /
+    `end_char` offsets in the joined text.
+    """
+    validate_chunk_params(chunk_size, overlap)
+    step = chunk_size - overlap
+
+    buffer = ""
+    buffer_start = 0  # offset of buffer[0] in the joined text
+    pos = 0  # start of the next chunk in buffer
+    first = True
+    for piece in pieces:
+        # Less than one chunk is left after pos, so dropping the consumed prefix copies little
+        buffer = buffer[pos:] + (piece if first else separator + piece)
+        buffer_start += pos
+        pos = 0
+        first = False
+        while len(buffer) - pos >= chunk_size:
+            yield Chunk(buffer[pos:pos + chunk_size], {"start_char": buffer_start + pos, "end_char": buffer_start + pos + chunk_size})
+            pos += step
+    # Tail: the remaining chunk starts, each shorter than chunk_size
+    while pos < len(buffer):
+        text = buffer[pos:pos + chunk_size]
+        yield Chunk(text, {"start_char": buffer_start + pos, "end_char": buffer_start + pos + len(text)})
+        pos += step
+
+
+def iter_page_chunks(pages, chunk_size=1000, overlap=200):
+    """Yield fixed-size Chunks page by page (chunks never span pages), with page and offset metadata."""
+    page_offset = 0
+    for page_no, page_text in enumerate(pages, start=1):
+        for start, end in iter_chunk_offsets(len(page_text), chunk_size, overlap):
+            yield Chunk(page_text[start:end], {
+                "page_start": page_no,
+                "page_end": page_no,
+                "start_char": page_offset + start,
+                "end_char": page_offset + end,
+            })
+        page_offset += len(page_text) + 1
+
+
+def iter_batches(items, batch_size):
+    """Group any iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Structure-aware chunking
+
+DEFAULT_MAX_TOKENS = 250  # all-MiniLM-L6-v2 truncates inputs at 256 word pieces
+DEFAULT_OVERLAP_TOKENS = 40
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+_WORD = re.compile(r"\w+|[^\w\s]")
+_NON_SPACE = re.compile(r"\S+")
+_NUMBERED_HEADING = re.compile(r"^(?:\d+(?:\.\d+)*\.?|[IVXLC]+\.|Chapter\s+\w+|Section\s+\w+)\s+\S", re.IGNORECASE)
+
+
+class _Unit(NamedTuple):
+    text: str
+    tokens: int
+    page: int
+    separator: str  # joins this unit to the previous one
+    heading: bool
+    start: int  # offsets in the page stream joined with single spaces
+    end: int
+
+
+def count_words(text):
+    """Cheap token estimate: words and punctuation marks."""
+    return len(_WORD.findall(text))
+
+
+def make_token_counter(model_name=None):
+    """Count tokens with the embedding model's tokenizer, falling back to count_words."""
+    if model_name is None:
+        return count_words
+    from embedding_models.embedding_models import get_model
+
+    tokenizer = getattr(get_model(model_name), "tokenizer", None)
+    if tokenizer is None:
+        return count_words
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def is_heading(line):
+    """Heuristic for headings: short lines without sentence punctuation that are numbered, upper or title case."""
+    if not line or len(line) > 80 or line[-1] in ".!?,;:" or not line[0].isalnum():
+        return False
+    if _NUMBERED_HEADING.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) < 3:
+        return False
+    if line.isupper():
+        return True
+    words = [w for w in line.split() if w[0].isalpha()]
+    minor = {"a", "an", "and", "as", "at", "by", "for", "in", "of", "on", "or", "the", "to", "with"}
+    return len(words) >= 2 and all(w[0].isupper() or w.lower() in minor for w in words)
+
+
+def _iter_units(pages, count_tokens, max_tokens):
+    """Split a page stream into headings and sentences, counting the tokens of each once.
+
+    Each unit carries its character offsets in `" ".join(pages)` (what
+    document_loader.extract_text returns), even though wrapped lines are re-joined.
+    """
+    separator = ""
+    page_offset = 0
+    for page_no, page_text in enumerate(pages, start=1):
+        paragraph = []  # (line, offset of the line in the joined text)
+
+        def flush_paragraph():
+            nonlocal separator
+            if not paragraph:
+                return
+            # Map positions in the re-joined paragraph back to the source lines
+            text = " ".join(line for line, _ in paragraph)
+            joined_starts, source_starts, pos = [], [], 0
+            for line, line_offset in paragraph:
+                joined_starts.append(pos)
+                source_starts.append(line_offset)
+                pos += len(line) + 1
+            paragraph.clear()
+
+            def to_source(joined_pos):
+                i = bisect.bisect_right(joined_starts, joined_pos) - 1
+                return source_starts[i] + joined_pos - joined_starts[i]
+
+            sentence_start = 0
+            for boundary in itertools.chain(_SENTENCE_END.finditer(text), [None]):
+                sentence_end = boundary.start() if boundary else len(text)
+                for piece_start, piece_end, tokens in _split_long(text, sentence_start, sentence_end, count_tokens, max_tokens):
+                    yield _Unit(text[piece_start:piece_end], tokens, page_no, separator, False,
+                                to_source(piece_start), to_source(piece_end - 1) + 1)
+                    separator = " "
+                if boundary:
+                    sentence_start = boundary.end()
+            separator = "\n\n"
+
+        line_offset = page_offset
+        for raw_line in page_text.split("\n"):
+            line = raw_line.strip()
+            start = line_offset + (len(raw_line) - len(raw_line.lstrip()))
+            line_offset += len(raw_line) + 1
+            if not line:
+                yield from flush_paragraph()
+            elif is_heading(line):
+                yield from flush_paragraph()
+                yield _Unit(line, count_tokens(line), page_no, "\n\n", True, start, start + len(line))
+                separator = "\n"
+            else:
+                paragraph.append((line, start))
+        yield from flush_paragraph()
+        page_offset += len(page_text) + 1
+
+
+def _split_long(text, start, end, count_tokens, max_tokens):
+    """Yield (start, end, tokens) pieces of text[start:end], splitting on words if it exceeds max_tokens.
+
+    Pieces are sized from the average tokens per word, then measured; a piece that
+    still exceeds max_tokens (its words are denser than average) is split again.
+    A single word over the limit is split by characters.
+    """
+    tokens = count_tokens(text[start:end])
+    if tokens <= max_tokens or end - start <= 1:
+        yield start, end, tokens
+        return
+    words = [m.span() for m in _NON_SPACE.finditer(text, start, end)]
+    if len(words) == 1:
+        middle = (start + end) // 2
+        yield from _split_long(text, start, middle, count_tokens, max_tokens)
+        yield from _split_long(text, middle, end, count_tokens, max_tokens)
+        return
+    # Always fewer words than the whole, so every recursion makes progress
+    words_per_piece = max(1, int(len(words) * max_tokens / tokens))
+    for i in range(0, len(words), words_per_piece):
+        piece_start, piece_end = words[i][0], words[min(i + words_per_piece, len(words)) - 1][1]
+        yield from _split_long(text, piece_start, piece_end, count_tokens, max_tokens)
+
+
+def iter_structured_chunks(pages, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                           count_tokens=count_words):
+    """Yield Chunks of at most max_tokens that span pages and break on sentence boundaries.
+
+    Headings start a new chunk (unless the current one is still under a quarter of
+    max_tokens) and are recorded as the chunk's `section`.
+    Past three quarters of max_tokens, a new paragraph also starts a new chunk.
+    Consecutive chunks share trailing sentences worth up to overlap_tokens.
+    Each chunk's metadata has `page_start`, `page_end`, `section` and the
+    `start_char` / `end_char` offsets of its source span. Every sentence is
+    tokenized once (over-long ones again per split) and visited a bounded number
+    of times, so the cost is linear in the text.
+    """
+    if max_tokens <= 0 or not 0 <= overlap_tokens < max_tokens:
+        raise ValueError(f"Invalid chunking parameters: max_tokens={max_tokens}, overlap_tokens={overlap_tokens}")
+
+    min_tokens = max_tokens // 4
+    current = []
+    current_tokens = 0
+    section = ""
+    chunk_section = ""
+
+    def emit():
+        text = current[0].text + "".join(unit.separator + unit.text for unit in current[1:])
+        return Chunk(text, {
+            "page_start": current[0].page,
+            "page_end": current[-1].page,
+            "section": chunk_section,
+            "start_char": current[0].start,
+            "end_char": current[-1].end,
+        })
+
+    def overlap_tail():
+        tail, tokens = [], 0
+        for unit in reversed(current):
+            if unit.heading or tokens + unit.tokens > overlap_tokens:
+                break
+            tail.append(unit)
+            tokens += unit.tokens
+        tail.reverse()
+        return tail, tokens
+
+    for unit in _iter_units(pages, count_tokens, max_tokens):
+        if unit.heading:
+            section = unit.text
+            # Merge tiny sections (e.g. table captions) into the following text
+            if current_tokens >= min_tokens:
+                yield emit()
+                current, current_tokens = [], 0
+        else:
+            paragraph_start = unit.separator == "\n\n"
+            full = current_tokens + unit.tokens > max_tokens
+            soft_break = paragraph_start and current_tokens >= 0.75 * max_tokens
+            if current and (full or soft_break):
+                yield emit()
+                current, current_tokens = overlap_tail()
+                # Don't let the overlap itself push the next chunk over the limit
+                while current and current_tokens + unit.tokens > max_tokens:
+                    current_tokens -= current.pop(0).tokens
+
+        if not current:
+            chunk_section = section
+        current.append(unit)
+        current_tokens += unit.tokens
+
+    if current:
+        yield emit()
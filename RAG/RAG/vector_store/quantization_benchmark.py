@@ -0,0 +1,125 @@
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Shared helpers live in sibling folders under RAG/RAG. Run as a script, this folder would come
+# first and `vector_store` would be vector_store.py instead of the package, so it is dropped
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path = [path for path in sys.path if os.path.abspath(path or os.curdir) != _HERE]
+sys.path.append(os.path.dirname(_HERE))
+from document_loader.document_loader import SUPPORTED_EXTENSIONS, extract_pages
+from embedding_cache.embedding_cache import EmbeddingCache, chunk_hash
+from embedding_models.embedding_models import get_model
+from quantization.quantization import DTYPES
+from text_chunker.text_chunker import iter_structured_chunks
+from vector_store.vector_store import LocalCollection, configure, get_backend, open_collection
+
+CORPUS_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_corpus(directory=CORPUS_DIRECTORY):
+    """Chunk texts of the PDF/DOCX files in a folder (Word lock files are skipped)."""
+    documents = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        if path.endswith(SUPPORTED_EXTENSIONS) and not os.path.basename(path).startswith("~$"):
+            documents.extend(chunk.text for chunk in iter_structured_chunks(extract_pages(path)))
+    return documents
+
+
+def load_collection(name):
+    results = open_collection(name, create=False).get(include=["documents", "embeddings"])
+    return results["documents"], np.asarray(results["embeddings"], dtype=np.float32)
+
+
+def make_questions(documents, n_questions, seed=0):
+    """The first sentence of randomly sampled chunks, as a stand-in for real questions."""
+    sample = random.Random(seed).sample(documents, min(n_questions, len(documents)))
+    return [re.split(r"(?<=[.?!])\s", document.strip(), maxsplit=1)[0] for document in sample if document.strip()]
+
+
+def recall(found, expected):
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected) if e]))
+
+
+def benchmark(documents, vectors, queries, n_results=5):
+    """Size and recall@n of each storage dtype against exact float32 search.
+
+    `disk_mb` is what the collection really keeps on disk (the float32 vectors file is
+    always there); `search_mb` is the copy exact search scans, which quantization shrinks.
+    """
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        truth = None
+        for dtype in DTYPES:
+            collection = LocalCollection(f"bench_{dtype}", directory, dtype=dtype)
+            collection.upsert(ids=ids, embeddings=vectors)
+            sizes = collection.storage_bytes()
+            cache = EmbeddingCache(os.path.join(directory, f"cache_{dtype}.sqlite"), dtype=dtype)
+            cache.put_many("benchmark", [chunk_hash(document or str(i)) for i, document in enumerate(documents)], vectors)
+
+            # Without re-ranking, then with the default full-precision re-ranking
+            for rescore_factor in ([0, collection.rescore_factor] if dtype != "float32" else [None]):
+                if rescore_factor is not None:
+                    collection.rescore_factor = rescore_factor
+                start = time.perf_counter()
+                found = collection.query(queries, n_results, include=[])["ids"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                truth = truth or found
+                report.append({
+                    "dtype": dtype,
+                    "rescore_factor": rescore_factor,
+                    "disk_mb": sizes["disk"] / 1e6,
+                    "search_mb": sizes["search"] / 1e6,
+                    "cache_mb": cache.stats()["vector_bytes"] / 1e6,
+                    f"recall@{n_results}": recall(found, truth),
+                    "ms_per_query": elapsed_ms / len(queries),
+                })
+            cache.close()
+            collection.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory saved and recall lost by float16 / int8 embedding storage.")
+    parser.add_argument("--collection", help="benchmark the stored embeddings of this collection instead of re-encoding the corpus")
+    parser.add_argument("--corpus", default=CORPUS_DIRECTORY, help="folder of PDF/DOCX files to chunk and encode")
+    parser.add_argument("--store", choices=["chroma", "local"], default=get_backend(),
+                        help="Chroma server, or the in-process local vector index (no server needed)")
+    parser.add_argument("--n-questions", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    configure(backend=args.store)
+    model = get_model()
+    if args.collection:
+        documents, vectors = load_collection(args.collection)
+    else:
+        documents = load_corpus(args.corpus)
+        vectors = np.asarray(model.encode(documents, batch_size=64), dtype=np.float32)
+    queries = np.asarray(model.encode(make_questions(documents, args.n_questions)), dtype=np.float32)
+    print(f"{len(vectors)} vectors of {vectors.shape[1]} dimensions, {len(queries)} questions")
+
+    report = benchmark(documents, vectors, queries, args.n_results)
+    for row in report:
+        rescore = "" if row["rescore_factor"] is None else f", rescore x{row['rescore_factor']}"
+        print(
+            f"{row['dtype']:>7}{rescore:<13} disk {row['disk_mb']:8.2f} MB, search {row['search_mb']:8.2f} MB, cache {row['cache_mb']:8.2f} MB, "
+            f"recall@{args.n_results} {row[f'recall@{args.n_results}']:.3f}, {row['ms_per_query']:.2f} ms/question"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,697 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+# Shared helpers live in sibling folders under RAG/RAG
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from quantization.quantization import bytes_per_vector, check_dtype, dequantize, quantize
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+BACKENDS = ("chroma", "local")
+INDEXES = ("exact", "hnsw")
+
+# Defaults can be overridden with environment variables or configure()
+_config = {
+    "backend": os.environ.get("RAG_VECTOR_STORE", "chroma"),
+    "directory": os.environ.get(
+        "RAG_LOCAL_INDEX_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "local_index"),
+    ),
+    "index": os.environ.get("RAG_LOCAL_INDEX", "exact"),
+    "dtype": os.environ.get("RAG_LOCAL_DTYPE", "float32"),
+    "chroma_host": os.environ.get("CHROMA_HOST", "localhost"),
+    "chroma_port": int(os.environ.get("CHROMA_PORT", 8000)),
+}
+
+# Open local collections keyed by (directory, name), so every caller shares one memory map
+_collections = {}
+_lock = threading.Lock()
+
+# Query embeddings x stored vectors scored per matrix product (bounds the temporary distance matrix)
+_SCORE_BLOCK = 1 << 24
+_SQL_VARIABLES = 500
+# Quantized search re-ranks this many candidates per requested result at full precision
+RESCORE_FACTOR = 4
+# Seconds a writer waits for another process's write transaction to finish
+WRITE_LOCK_TIMEOUT = 30
+
+
+def configure(backend=None, directory=None, index=None, dtype=None):
+    """Select the vector store used by open_collection for the rest of the process."""
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown vector store backend: {backend}")
+        _config["backend"] = backend
+    if directory is not None:
+        _config["directory"] = directory
+    if index is not None:
+        if index not in INDEXES:
+            raise ValueError(f"Unknown local index: {index}")
+        _config["index"] = index
+    if dtype is not None:
+        _config["dtype"] = check_dtype(dtype)
+
+
+def get_backend():
+    return _config["backend"]
+
+
+def get_chroma_client():
+    import chromadb
+
+    return chromadb.HttpClient(
+        host=_config["chroma_host"],
+        port=_config["chroma_port"],
+        ssl=False
+    )
+
+
+def open_collection(name, backend=None, create=True):
+    """Return the named collection from the configured backend.
+
+    Both backends return an object with the collection API the scripts use:
+    `name`, `upsert`, `get`, `query`, `delete` and `count`.
+    """
+    backend = backend or _config["backend"]
+    if backend == "chroma":
+        client = get_chroma_client()
+        return client.get_or_create_collection(name) if create else client.get_collection(name)
+    if backend != "local":
+        raise ValueError(f"Unknown vector store backend: {backend}")
+
+    key = (os.path.abspath(_config["directory"]), name)
+    with _lock:
+        collection = _collections.get(key)
+        if collection is None:
+            if not create and not os.path.exists(os.path.join(key[0], name, "items.sqlite")):
+                raise ValueError(f"Collection {name} does not exist.")
+            collection = LocalCollection(name, key[0], _config["index"], _config["dtype"])
+            _collections[key] = collection
+        return collection
+
+
+def collection_key(collection):
+    """Name for the files kept per collection next to the store (BM25 index, version stamp).
+
+    It adds the backend and a hash of its location (Chroma address or local index
+    directory) to the collection name, so the same name in two stores never shares them.
+    """
+    if isinstance(collection, LocalCollection):
+        backend, location = "local", os.path.abspath(os.path.dirname(collection.path))
+    else:
+        backend, location = "chroma", f"{_config['chroma_host']}:{_config['chroma_port']}"
+    return f"{collection.name}.{backend}-{hashlib.sha1(location.encode('utf-8')).hexdigest()[:8]}"
+
+
+def delete_collection(name, backend=None):
+    backend = backend or _config["backend"]
+    if backend == "chroma":
+        get_chroma_client().delete_collection(name)
+        return
+    directory = os.path.abspath(_config["directory"])
+    with _lock:
+        collection = _collections.pop((directory, name), None)
+        if collection is not None:
+            collection.close()
+    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def validate_where(where):
+    """Raise ValueError unless `where` is a filter both backends accept.
+
+    Checks the shape only: a dict of field conditions, known `$` operators, list
+    operands for `$in` / `$nin` / `$and` / `$or`, numbers for range operators and
+    scalars everywhere else.
+    """
+    if not isinstance(where, dict) or not where:
+        raise ValueError(f"where must be a non-empty object, got {where!r}")
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            if not isinstance(condition, list) or not condition:
+                raise ValueError(f"{key} needs a non-empty list of filters")
+            for part in condition:
+                validate_where(part)
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported where operator: {key}")
+        elif isinstance(condition, dict):
+            if not condition:
+                raise ValueError(f"Empty condition for {key}")
+            for operator, operand in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                if operator in ("$in", "$nin"):
+                    if not isinstance(operand, list) or not all(_is_scalar(item) for item in operand):
+                        raise ValueError(f"{operator} needs a list of values for {key}")
+                elif operator in ("$eq", "$ne"):
+                    if not _is_scalar(operand):
+                        raise ValueError(f"{operator} needs a single value for {key}")
+                elif isinstance(operand, bool) or not isinstance(operand, (int, float)):
+                    raise ValueError(f"{operator} needs a number for {key}")
+        elif not _is_scalar(condition):
+            raise ValueError(f"Invalid condition for {key}: {condition!r}")
+
+
+def _is_scalar(value):
+    return isinstance(value, (str, int, float, bool))
+
+
+def matches_where(metadata, where):
+    """Evaluate a Chroma-style `where` filter against one metadata dict."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                if not _OPERATORS[operator](value, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _intersect(rows, other):
+    if rows is None:
+        return other
+    if other is None:
+        return rows
+    return rows & other
+
+
+class MetadataIndex:
+    """Secondary index over chunk metadata, used to pre-filter `where` queries.
+
+    Equality and `$in` conditions are looked up in {key: {value: rows}}; range operators
+    on numeric keys compare a NumPy column (built on first use) in one vectorized step.
+    `candidates` returns a superset of the matching rows, or None when the filter cannot
+    use the index; callers still check each candidate with matches_where.
+    """
+
+    _RANGES = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+    def __init__(self, metadatas):
+        self._metadatas = metadatas  # the collection's row -> metadata list
+        self._values = {}
+        self._columns = {}
+
+    @staticmethod
+    def _is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    def add(self, row, metadata):
+        for key, value in metadata.items():
+            if isinstance(value, (str, int, float, bool)):
+                self._values.setdefault(key, {}).setdefault(value, set()).add(row)
+            column = self._columns.get(key)
+            if column is not None:
+                if row >= len(column):
+                    column = self._columns[key] = np.concatenate(
+                        [column, np.full(len(self._metadatas) - len(column), np.nan)])
+                column[row] = value if self._is_number(value) else np.nan
+
+    def remove(self, row, metadata):
+        for key, value in metadata.items():
+            rows = self._values.get(key, {}).get(value) if isinstance(value, (str, int, float, bool)) else None
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._values[key][value]
+            column = self._columns.get(key)
+            if column is not None and row < len(column):
+                column[row] = np.nan
+
+    def _column(self, key):
+        column = self._columns.get(key)
+        if column is None:
+            column = np.full(len(self._metadatas), np.nan)
+            for row, metadata in enumerate(self._metadatas):
+                value = metadata.get(key) if metadata else None
+                if self._is_number(value):
+                    column[row] = value
+            self._columns[key] = column
+        return column
+
+    def _lookup(self, key, operator, operand):
+        values = self._values.get(key, {})
+        if operator == "$eq":
+            return values.get(operand, set())
+        if operator == "$in":
+            return set().union(*(values.get(value, ()) for value in operand))
+        if operator in self._RANGES and self._is_number(operand):
+            return set(np.flatnonzero(self._RANGES[operator](self._column(key), operand)).tolist())
+        return None
+
+    def candidates(self, where):
+        rows = None
+        for key, condition in where.items():
+            if key == "$and":
+                for part in condition:
+                    rows = _intersect(rows, self.candidates(part))
+            elif key == "$or":
+                parts = [self.candidates(part) for part in condition]
+                if all(part is not None for part in parts):
+                    rows = _intersect(rows, set().union(*parts))
+            else:
+                conditions = condition if isinstance(condition, dict) else {"$eq": condition}
+                for operator, operand in conditions.items():
+                    rows = _intersect(rows, self._lookup(key, operator, operand))
+        return rows
+
+
+class LocalCollection:
+    """In-process collection with the part of the Chroma collection API the scripts use.
+
+    Vectors live in a memory-mapped float32 matrix (`vectors.f32`, one row per chunk,
+    rows of deleted chunks are reused). Ids, documents and metadata live in SQLite
+    (`items.sqlite`); metadata is also kept in memory, with a MetadataIndex that
+    narrows `where` filters down to candidate rows before they are checked.
+    Queries rank by squared L2 distance, like Chroma's default space. With index="exact"
+    every batch of query embeddings is scored with one matrix product; with index="hnsw"
+    an hnswlib graph is built on the first query and updated by later writes.
+
+    With dtype="float16" or "int8", exact search scores an in-memory quantized copy of
+    the vectors instead, then re-ranks the best `rescore_factor * n_results` candidates
+    against the float32 vectors on disk. Stored vectors are always kept at full precision.
+
+    Writes from another process are picked up on the next call (SQLite's data_version).
+    Each write holds an SQLite write lock from reloading that state until its commit,
+    so concurrent writers in different processes never hand out the same row.
+    """
+
+    MIN_CAPACITY = 1024
+    _QUANTIZE_BLOCK = 1 << 16
+
+    def __init__(self, name, directory, index="exact", dtype="float32"):
+        if index not in INDEXES:
+            raise ValueError(f"Unknown local index: {index}")
+        if index == "hnsw" and hnswlib is None:
+            raise ImportError("`hnswlib` not installed. Please install using `pip install hnswlib`.")
+        if index == "hnsw" and check_dtype(dtype) != "float32":
+            raise ValueError("Quantized storage is only supported by the exact local index.")
+        self.name = name
+        self.index = index
+        self.dtype = check_dtype(dtype)
+        self.rescore_factor = RESCORE_FACTOR
+        self.path = os.path.join(directory, name)
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(self.path, "items.sqlite"), timeout=WRITE_LOCK_TIMEOUT,
+                                   check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS items (id TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE, document TEXT, metadata TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._vectors = None
+        self._load()
+
+    # Loading and growing
+
+    def _data_version(self):
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self):
+        row = self._db.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        self._dim = int(row[0]) if row else None
+        self._vectors = None
+        capacity = 0
+        if self._dim and os.path.exists(self._vectors_path):
+            capacity = os.path.getsize(self._vectors_path) // (4 * self._dim)
+            if capacity:
+                self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+
+        self._row_of = {}
+        self._ids = [None] * capacity
+        self._metadatas = [None] * capacity
+        self._live = np.zeros(capacity, dtype=bool)
+        self._index = MetadataIndex(self._metadatas)
+        for chunk_id, row, metadata in self._db.execute("SELECT id, row, metadata FROM items"):
+            self._row_of[chunk_id] = row
+            self._ids[row] = chunk_id
+            self._metadatas[row] = json.loads(metadata) if metadata else {}
+            self._live[row] = True
+            self._index.add(row, self._metadatas[row])
+        self._n_rows = int(np.flatnonzero(self._live)[-1]) + 1 if self._row_of else 0
+        self._free = [r for r in range(self._n_rows - 1, -1, -1) if not self._live[r]]
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        if self._n_rows:
+            block = self._vectors[:self._n_rows]
+            self._norms[:self._n_rows] = np.einsum("ij,ij->i", block, block)
+        self._codes = self._scales = self._code_norms = None
+        if self.dtype != "float32":
+            self._codes = np.zeros((capacity, self._dim or 0), dtype=self.dtype)
+            self._scales = np.ones(capacity, dtype=np.float32)
+            self._code_norms = np.zeros(capacity, dtype=np.float32)
+            for start in range(0, self._n_rows, self._QUANTIZE_BLOCK):
+                rows = np.arange(start, min(start + self._QUANTIZE_BLOCK, self._n_rows))
+                self._set_codes(rows, self._vectors[rows])
+        self._hnsw = None
+        self._seen_version = self._data_version()
+
+    def _refresh(self):
+        """Reload if another process committed changes since we last looked."""
+        if self._data_version() != self._seen_version:
+            self._load()
+
+    def _set_codes(self, rows, vectors):
+        codes, scales = quantize(vectors, self.dtype)
+        self._codes[rows] = codes
+        if scales is not None:
+            self._scales[rows] = scales
+        approx = dequantize(codes, scales, self.dtype)
+        self._code_norms[rows] = np.einsum("ij,ij->i", approx, approx)
+
+    def _ensure_capacity(self, n_rows):
+        capacity = len(self._live)
+        if n_rows <= capacity:
+            return
+        new_capacity = max(self.MIN_CAPACITY, capacity * 2, n_rows)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(new_capacity, self._dim))
+        extra = new_capacity - capacity
+        self._ids.extend([None] * extra)
+        self._metadatas.extend([None] * extra)
+        self._live = np.concatenate([self._live, np.zeros(extra, dtype=bool)])
+        self._norms = np.concatenate([self._norms, np.zeros(extra, dtype=np.float32)])
+        if self._codes is not None:
+            codes = np.zeros((new_capacity, self._dim), dtype=self.dtype)
+            if capacity:
+                codes[:capacity] = self._codes
+            self._codes = codes
+            self._scales = np.concatenate([self._scales, np.ones(extra, dtype=np.float32)])
+            self._code_norms = np.concatenate([self._code_norms, np.zeros(extra, dtype=np.float32)])
+        if self._hnsw is not None:
+            self._hnsw.resize_index(new_capacity)
+
+    # Writes
+
+    @contextlib.contextmanager
+    def _write_transaction(self):
+        """Hold the database write lock, with state reloaded from the latest commit, until the block commits."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                yield
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                # In-memory state may be ahead of what was committed; reload it on the next call
+                self._seen_version = None
+                raise
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        if embeddings is None:
+            raise ValueError("The local vector store needs precomputed embeddings.")
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(f"Expected {len(ids)} embeddings, got an array of shape {vectors.shape}")
+        metadatas = metadatas or [None] * len(ids)
+        documents = documents or [None] * len(ids)
+
+        with self._write_transaction():
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._db.execute("INSERT OR REPLACE INTO settings VALUES ('dim', ?)", (str(self._dim),))
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self._dim}")
+
+            rows = []
+            for chunk_id in ids:
+                row = self._row_of.get(chunk_id)
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row = self._n_rows
+                        self._n_rows += 1
+                    self._row_of[chunk_id] = row
+                rows.append(row)
+            self._ensure_capacity(self._n_rows)
+
+            # Vectors go to disk before the rows that point at them are committed
+            self._vectors[rows] = vectors
+            self._vectors.flush()
+            self._norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+            if self._codes is not None:
+                self._set_codes(rows, vectors)
+            for chunk_id, row, metadata in zip(ids, rows, metadatas):
+                if self._metadatas[row] is not None:
+                    self._index.remove(row, self._metadatas[row])
+                self._ids[row] = chunk_id
+                self._metadatas[row] = metadata or {}
+                self._live[row] = True
+                self._index.add(row, self._metadatas[row])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO items (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                [(chunk_id, row, document, json.dumps(metadata) if metadata else None)
+                 for chunk_id, row, document, metadata in zip(ids, rows, documents, metadatas)],
+            )
+            if self._hnsw is not None:
+                self._hnsw.add_items(vectors, rows)
+
+    add = upsert
+
+    def update(self, ids, metadatas):
+        """Replace the metadata of existing chunks, leaving vectors and documents alone; unknown ids are skipped."""
+        with self._write_transaction():
+            updates = []
+            for chunk_id, metadata in zip(ids, metadatas):
+                row = self._row_of.get(chunk_id)
+                if row is None:
+                    continue
+                self._index.remove(row, self._metadatas[row])
+                self._metadatas[row] = metadata or {}
+                self._index.add(row, self._metadatas[row])
+                updates.append((json.dumps(metadata) if metadata else None, chunk_id))
+            self._db.executemany("UPDATE items SET metadata = ? WHERE id = ?", updates)
+
+    def delete(self, ids=None, where=None):
+        with self._write_transaction():
+            rows = self._select_rows(ids, where)
+            if not rows:
+                return
+            deleted_ids = [self._ids[row] for row in rows]
+            for chunk_id, row in zip(deleted_ids, rows):
+                del self._row_of[chunk_id]
+                self._index.remove(row, self._metadatas[row])
+                self._ids[row] = None
+                self._metadatas[row] = None
+                self._live[row] = False
+                self._free.append(row)
+                if self._hnsw is not None:
+                    self._hnsw.mark_deleted(row)
+            self._db.executemany("DELETE FROM items WHERE id = ?", [(chunk_id,) for chunk_id in deleted_ids])
+
+    # Reads
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+    def _select_rows(self, ids=None, where=None):
+        if ids is not None:
+            rows = [self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]
+        elif where:
+            candidates = self._index.candidates(where)
+            rows = sorted(candidates) if candidates is not None else np.flatnonzero(self._live[:self._n_rows]).tolist()
+        else:
+            rows = np.flatnonzero(self._live[:self._n_rows]).tolist()
+        if where:
+            rows = [row for row in rows if matches_where(self._metadatas[row], where)]
+        return rows
+
+    def _documents(self, ids):
+        documents = {}
+        for start in range(0, len(ids), _SQL_VARIABLES):
+            batch = ids[start:start + _SQL_VARIABLES]
+            query = f"SELECT id, document FROM items WHERE id IN ({','.join('?' * len(batch))})"
+            documents.update(self._db.execute(query, batch))
+        return [documents.get(chunk_id) for chunk_id in ids]
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        with self._lock:
+            self._refresh()
+            rows = self._select_rows(ids, where)
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            chunk_ids = [self._ids[row] for row in rows]
+            return {
+                "ids": chunk_ids,
+                "embeddings": [np.array(self._vectors[row]) for row in rows] if "embeddings" in include else None,
+                "documents": self._documents(chunk_ids) if "documents" in include else None,
+                "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+            }
+
+    def _search_exact(self, queries, k, rows=None):
+        """Top-k (rows, squared L2 distances) per query, one matrix product per block of queries."""
+        if rows is None:
+            candidates = np.flatnonzero(self._live[:self._n_rows])
+            # Scoring the contiguous prefix avoids copying the matrix when few rows are free
+            if len(candidates) > 0.9 * self._n_rows:
+                matrix, norms, candidates = self._vectors[:self._n_rows], self._norms[:self._n_rows], None
+            else:
+                matrix, norms = self._vectors[candidates], self._norms[candidates]
+        else:
+            candidates = np.asarray(rows, dtype=np.int64)
+            matrix, norms = self._vectors[candidates], self._norms[candidates]
+        dead = None if candidates is not None else ~self._live[:self._n_rows]
+
+        n = len(matrix)
+        k = min(k, n if dead is None else n - int(dead.sum()))
+        if k <= 0:
+            return [[] for _ in queries], [[] for _ in queries]
+
+        all_rows, all_distances = [], []
+        block = max(1, _SCORE_BLOCK // n)
+        for start in range(0, len(queries), block):
+            q = queries[start:start + block]
+            distances = norms[None, :] - 2 * (q @ matrix.T) + np.einsum("ij,ij->i", q, q)[:, None]
+            if dead is not None:
+                distances[:, dead] = np.inf
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (len(q), 1))
+            top_distances = np.take_along_axis(distances, top, axis=1)
+            order = np.argsort(top_distances, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_distances = np.maximum(np.take_along_axis(top_distances, order, axis=1), 0)
+            found = top if candidates is None else candidates[top]
+            all_rows.extend(found.tolist())
+            all_distances.extend(top_distances.tolist())
+        return all_rows, all_distances
+
+    def _search_quantized(self, queries, k, rows=None):
+        """Top-k (rows, squared L2 distances) from the quantized copy, re-ranked at full precision.
+
+        The quantized matrix is converted to float32 one block of rows at a time, so the
+        temporary matrices stay bounded. With rescore_factor=0 the quantized ranking and its
+        approximate distances are returned as is.
+        """
+        candidates = np.flatnonzero(self._live[:self._n_rows]) if rows is None else np.asarray(rows, dtype=np.int64)
+        k = min(k, len(candidates))
+        if k <= 0:
+            return [[] for _ in queries], [[] for _ in queries]
+        fetch = min(len(candidates), k * max(1, self.rescore_factor))
+
+        # |q|^2 is the same for every row of a query, so it is left out of the ranking score
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        block = max(1, _SCORE_BLOCK // max(len(queries), self._dim))
+        for start in range(0, len(candidates), block):
+            block_rows = candidates[start:start + block]
+            products = queries @ self._codes[block_rows].astype(np.float32).T
+            if self.dtype == "int8":
+                products *= self._scales[block_rows][None, :]
+            scores = self._code_norms[block_rows][None, :] - 2 * products
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(block_rows, scores.shape)], axis=1)
+            if best_scores.shape[1] > fetch:
+                top = np.argpartition(best_scores, fetch - 1, axis=1)[:, :fetch]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        all_rows, all_distances = [], []
+        for query, found, scores in zip(queries, best_rows, best_scores):
+            if self.rescore_factor:
+                found = np.sort(found)  # read the float32 rows in file order
+                vectors = np.asarray(self._vectors[found])
+                distances = np.einsum("ij,ij->i", vectors - query, vectors - query)
+            else:
+                distances = np.maximum(scores + query @ query, 0)
+            order = np.argsort(distances)[:k]
+            all_rows.append(found[order].tolist())
+            all_distances.append(distances[order].tolist())
+        return all_rows, all_distances
+
+    def _search_hnsw(self, queries, k):
+        if self._hnsw is None:
+            live_rows = np.flatnonzero(self._live[:self._n_rows])
+            index = hnswlib.Index(space="l2", dim=self._dim)
+            index.init_index(max_elements=max(len(self._live), 1), ef_construction=200, M=16)
+            if len(live_rows):
+                index.add_items(np.asarray(self._vectors[live_rows]), live_rows)
+            self._hnsw = index
+        k = min(k, len(self._row_of))
+        if k <= 0:
+            return [[] for _ in queries], [[] for _ in queries]
+        self._hnsw.set_ef(max(50, k))
+        labels, distances = self._hnsw.knn_query(queries, k=k)
+        return labels.tolist(), distances.tolist()
+
+    def query(self, query_embeddings, n_results=10, where=None,
+              include=("metadatas", "documents", "distances")):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        with self._lock:
+            self._refresh()
+            if self._dim is None:
+                rows, distances = [[] for _ in queries], [[] for _ in queries]
+            elif self._codes is not None:
+                rows, distances = self._search_quantized(queries, n_results, self._select_rows(None, where) if where else None)
+            elif where:
+                rows, distances = self._search_exact(queries, n_results, self._select_rows(None, where))
+            elif self.index == "hnsw":
+                rows, distances = self._search_hnsw(queries, n_results)
+            else:
+                rows, distances = self._search_exact(queries, n_results)
+
+            ids = [[self._ids[row] for row in query_rows] for query_rows in rows]
+            return {
+                "ids": ids,
+                "embeddings": [[np.array(self._vectors[row]) for row in query_rows] for query_rows in rows] if "embeddings" in include else None,
+                "documents": [self._documents(query_ids) for query_ids in ids] if "documents" in include else None,
+                "metadatas": [[self._metadatas[row] for row in query_rows] for query_rows in rows] if "metadatas" in include else None,
+                "distances": distances if "distances" in include else None,
+            }
+
+    def storage_bytes(self):
+        """{"disk": bytes of the collection's files, "search": bytes of the vectors exact search scans}.
+
+        Disk always holds the float32 vectors file, whatever the dtype; a quantized
+        collection adds its in-memory codes on top of that.
+        """
+        with self._lock:
+            self._refresh()
+            disk = sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+            return {"disk": disk, "search": len(self._row_of) * bytes_per_vector(self._dim or 0, self.dtype)}
+
+    def close(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            self._db.close()
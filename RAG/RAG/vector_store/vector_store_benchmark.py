@@ -0,0 +1,87 @@
+import argparse
+import time
+
+import numpy as np
+
+from vector_store import delete_collection, open_collection
+
+BENCHMARK_COLLECTION = "vector_store_benchmark"
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def benchmark(backend, n_vectors=20_000, dim=384, n_queries=200, n_results=5, write_batch=1000, query_batch=64, seed=0):
+    """Time writes, single-question queries and batched queries on random vectors."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n_vectors, dim)).astype(np.float32)
+    queries = rng.normal(size=(n_queries, dim)).astype(np.float32)
+
+    try:
+        delete_collection(BENCHMARK_COLLECTION, backend)
+    except Exception:
+        pass
+    collection = open_collection(BENCHMARK_COLLECTION, backend)
+
+    try:
+        start = time.perf_counter()
+        for offset in range(0, n_vectors, write_batch):
+            batch = vectors[offset:offset + write_batch]
+            collection.upsert(
+                ids=[f"bench_chunk_{i}" for i in range(offset, offset + len(batch))],
+                embeddings=batch.tolist() if backend == "chroma" else batch,
+                documents=[f"document {i}" for i in range(offset, offset + len(batch))],
+                metadatas=[{"chunk_index": i, "source_file": "bench"} for i in range(offset, offset + len(batch))],
+            )
+        write_seconds = time.perf_counter() - start
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            collection.query(query_embeddings=[query.tolist()], n_results=n_results)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        for offset in range(0, n_queries, query_batch):
+            collection.query(query_embeddings=queries[offset:offset + query_batch].tolist(), n_results=n_results)
+        batch_seconds = time.perf_counter() - start
+    finally:
+        delete_collection(BENCHMARK_COLLECTION, backend)
+
+    return {
+        "backend": backend,
+        "vectors": n_vectors,
+        "writes_per_sec": n_vectors / write_seconds,
+        "query_p50_ms": percentile(latencies, 0.50),
+        "query_p95_ms": percentile(latencies, 0.95),
+        "query_p99_ms": percentile(latencies, 0.99),
+        "batched_queries_per_sec": n_queries / batch_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the local vector store with the Chroma server.")
+    parser.add_argument("--backends", nargs="+", choices=["local", "chroma"], default=["local", "chroma"])
+    parser.add_argument("--vectors", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=5)
+    args = parser.parse_args()
+
+    for backend in args.backends:
+        try:
+            result = benchmark(backend, args.vectors, args.dim, args.queries, args.n_results)
+        except Exception as e:
+            print(f"{backend}: benchmark failed ({e})")
+            continue
+        print(
+            f"{backend:>6}: {result['writes_per_sec']:.0f} writes/sec, "
+            f"query p50 {result['query_p50_ms']:.2f} ms, p95 {result['query_p95_ms']:.2f} ms, "
+            f"p99 {result['query_p99_ms']:.2f} ms, {result['batched_queries_per_sec']:.0f} batched queries/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()